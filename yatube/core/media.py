@@ -0,0 +1,84 @@
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404
+from django.utils._os import safe_join
+from django.utils.http import quote_etag
+
+# имена по хешу содержимого: оригиналы постов и миниатюры sorl
+IMMUTABLE_NAME = re.compile(
+    r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{32,64}\.\w+$')
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+MEDIA_MAX_AGE = 60 * 60
+SINGLE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def media_file(path):
+    """Полный путь и stat файла из MEDIA_ROOT или Http404."""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        info = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404('Файл не найден')
+    if not stat.S_ISREG(info.st_mode):
+        raise Http404('Файл не найден')
+    return full_path, info
+
+
+def is_immutable(path):
+    """Содержимое файла никогда не меняется под этим именем."""
+    return IMMUTABLE_NAME.search(path) is not None
+
+
+def media_etag(path, info):
+    if is_immutable(path):
+        return quote_etag(os.path.splitext(os.path.basename(path))[0])
+    return quote_etag(f'{info.st_size:x}-{info.st_mtime_ns:x}')
+
+
+def byte_range(header, size):
+    """Запрошенный диапазон байтов (начало, конец) включительно.
+
+    None — отдать файл целиком: заголовка нет, он непонятен или просит
+    несколько диапазонов. False — диапазон за пределами файла.
+    """
+    match = SINGLE_RANGE.match(header.strip())
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start:
+        if not end:
+            return None
+        length = int(end)
+        if not length or not size:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    if end and int(end) < start:
+        return None
+    if start >= size:
+        return False
+    end = min(int(end), size - 1) if end else size - 1
+    return start, end
+
+
+class FileRange:
+    """Часть открытого файла, которую FileResponse читает как файл."""
+
+    def __init__(self, file_, start, length):
+        file_.seek(start)
+        self.file = file_
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
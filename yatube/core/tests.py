@@ -1,6 +1,13 @@
+import os
+import shutil
+import tempfile
 from http import HTTPStatus
+from unittest import mock
 
-from django.test import TestCase
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
 class ViewTestClass(TestCase):
@@ -10,3 +17,96 @@ class ViewTestClass(TestCase):
                          'внезапно стала доступна страница unknown')
 
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ServeMediaTest(TestCase):
+    HASHED = 'posts/ab/cd/' + 'abcd' * 16 + '.png'
+    PLAIN = 'posts/plain.txt'
+    CONTENT = b'0123456789'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for name in (cls.HASHED, cls.PLAIN):
+            path = os.path.join(TEMP_MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file_:
+                file_.write(cls.CONTENT)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def get(self, name, **headers):
+        return self.client.get(settings.MEDIA_URL + name, **headers)
+
+    def test_full_file(self):
+        """Файл отдаётся целиком с заголовками кеширования."""
+        response = self.get(self.HASHED)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENT)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertNotIn('immutable', self.get(self.PLAIN)['Cache-Control'])
+
+    def test_ranges(self):
+        """Range отдаёт часть файла, недопустимый — 416."""
+        cases = (
+            ('bytes=2-4', b'234', 'bytes 2-4/10'),
+            ('bytes=7-', b'789', 'bytes 7-9/10'),
+            ('bytes=-2', b'89', 'bytes 8-9/10'),
+            ('bytes=8-100', b'89', 'bytes 8-9/10'),
+        )
+        for header, body, content_range in cases:
+            with self.subTest(range=header):
+                response = self.get(self.PLAIN, HTTP_RANGE=header)
+                self.assertEqual(response.status_code,
+                                 HTTPStatus.PARTIAL_CONTENT)
+                self.assertEqual(b''.join(response.streaming_content), body)
+                self.assertEqual(response['Content-Range'], content_range)
+                self.assertEqual(response['Content-Length'], str(len(body)))
+        response = self.get(self.PLAIN, HTTP_RANGE='bytes=10-')
+        self.assertEqual(response.status_code,
+                         HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+        response = self.get(self.PLAIN, HTTP_RANGE='bytes=0-1,4-5')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_if_range_mismatch_sends_whole_file(self):
+        """Устаревший If-Range отменяет Range."""
+        response = self.get(self.PLAIN, HTTP_RANGE='bytes=0-1',
+                            HTTP_IF_RANGE='"устаревший"')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_conditional_requests(self):
+        """If-None-Match и If-Modified-Since дают 304."""
+        response = self.get(self.HASHED)
+        self.assertEqual(
+            self.get(self.HASHED, HTTP_IF_NONE_MATCH=response['ETag'])
+            .status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertEqual(
+            self.get(self.HASHED,
+                     HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+            .status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_missing_and_outside_files(self):
+        """Чужие пути и каталоги не отдаются."""
+        for name in ('posts/none.png', '../manage.py', 'posts/'):
+            with self.subTest(name=name):
+                self.assertEqual(self.get(name).status_code,
+                                 HTTPStatus.NOT_FOUND)
+
+    def test_proxy_delegation(self):
+        """Отдачу можно поручить прокси через X-Accel-Redirect и X-Sendfile."""
+        with mock.patch('core.views.MEDIA_ACCEL_REDIRECT', '/internal/'):
+            response = self.get(self.HASHED)
+        self.assertEqual(response['X-Accel-Redirect'],
+                         '/internal/' + self.HASHED)
+        self.assertEqual(response.content, b'')
+        with mock.patch('core.views.MEDIA_SENDFILE', True):
+            response = self.get(self.PLAIN)
+        self.assertEqual(response['X-Sendfile'],
+                         os.path.join(TEMP_MEDIA_ROOT, self.PLAIN))
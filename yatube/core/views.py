@@ -1,4 +1,16 @@
+import mimetypes
+from http import HTTPStatus
+
+from django.http import FileResponse, HttpResponse
 from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.encoding import iri_to_uri
+from django.utils.http import http_date
+
+from yatube.settings import MEDIA_ACCEL_REDIRECT, MEDIA_SENDFILE
+
+from .media import (IMMUTABLE_MAX_AGE, MEDIA_MAX_AGE, FileRange, byte_range,
+                    is_immutable, media_etag, media_file)
 
 
 def page_not_found(request, exception):
@@ -15,3 +27,66 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def serve_media(request, path):
+    """Отдаёт файл из MEDIA_ROOT с поддержкой Range и условных запросов.
+
+    Целый файл уходит через FileResponse, и WSGI-сервер может отправить
+    его через sendfile без копирования. Если настроен фронтенд-прокси,
+    файл отдаёт он по заголовку X-Accel-Redirect или X-Sendfile.
+    """
+    full_path, info = media_file(path)
+    etag = media_etag(path, info)
+    last_modified = int(info.st_mtime)
+    content_type = (mimetypes.guess_type(full_path)[0]
+                    or 'application/octet-stream')
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = media_response(request, path, full_path, info.st_size,
+                                  content_type, etag, last_modified)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    if is_immutable(path):
+        patch_cache_control(response, public=True, immutable=True,
+                            max_age=IMMUTABLE_MAX_AGE)
+    else:
+        patch_cache_control(response, public=True, max_age=MEDIA_MAX_AGE)
+    return response
+
+
+def media_response(request, path, full_path, size, content_type, etag,
+                   last_modified):
+    if MEDIA_ACCEL_REDIRECT:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = iri_to_uri(MEDIA_ACCEL_REDIRECT + path)
+        return response
+    if MEDIA_SENDFILE:
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+        return response
+
+    requested = None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range is None or if_range in (etag, http_date(last_modified)):
+        requested = byte_range(request.META.get('HTTP_RANGE', ''), size)
+    if requested is False:
+        response = HttpResponse(
+            status=HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    file_ = open(full_path, 'rb')
+    if requested is None:
+        response = FileResponse(file_, content_type=content_type)
+    else:
+        start, end = requested
+        response = FileResponse(FileRange(file_, start, end - start + 1),
+                                status=HTTPStatus.PARTIAL_CONTENT,
+                                content_type=content_type)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
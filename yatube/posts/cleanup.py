@@ -0,0 +1,152 @@
+import os
+import time
+from itertools import islice
+
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from .models import Post
+
+GC_BATCH_SIZE = 500
+# свежие файлы не трогаем: пост или запись о миниатюре могут быть ещё
+# не сохранены
+GC_MIN_AGE = 60 * 60
+
+
+class StoredKey:
+    """Картинка, от которой в хранилище ключей остался только ключ."""
+
+    def __init__(self, key):
+        self.key = key
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def walk_files(storage, directory, min_age):
+    """Имена файлов каталога хранилища, обходя его без полного списка."""
+    root = storage.path('')
+    pending = [storage.path(directory)]
+    deadline = time.time() - min_age
+    while pending:
+        try:
+            entries = os.scandir(pending.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif (entry.is_file(follow_symlinks=False)
+                        and entry.stat().st_mtime < deadline):
+                    yield os.path.relpath(entry.path, root).replace(
+                        os.sep, '/')
+
+
+def live_images(names):
+    return set(Post.objects.filter(image__in=names)
+               .values_list('image', flat=True))
+
+
+def orphaned_images(batch_size=GC_BATCH_SIZE, min_age=GC_MIN_AGE):
+    """Картинки в каталоге постов, на которые не ссылается ни один пост."""
+    field = Post._meta.get_field('image')
+    names = walk_files(field.storage, field.upload_to, min_age)
+    for batch in batched(names, batch_size):
+        live = live_images(batch)
+        yield from (name for name in batch if name not in live)
+
+
+def still_orphaned(storage, name, deadline):
+    """Перепроверка прямо перед удалением: пока шёл обход, картинку могли
+    загрузить снова, а это обновляет время изменения файла."""
+    try:
+        if os.path.getmtime(storage.path(name)) >= deadline:
+            return False
+    except FileNotFoundError:
+        return False
+    return not Post.objects.filter(image=name).exists()
+
+
+def kv_keys(identity, batch_size):
+    """Ключи хранилища миниатюр, пачками по порядку ключа."""
+    prefix = add_prefix('', identity)
+    last = prefix
+    while True:
+        batch = list(KVStore.objects.filter(
+            key__startswith=prefix, key__gt=last)
+            .order_by('key').values_list('key', flat=True)[:batch_size])
+        if not batch:
+            return
+        last = batch[-1]
+        yield [key[len(prefix):] for key in batch]
+
+
+def stale_thumbnail_sources(batch_size=GC_BATCH_SIZE):
+    """Исходники с миниатюрами, которых уже нет среди картинок постов."""
+    for keys in kv_keys('thumbnails', batch_size):
+        values = dict(KVStore.objects.filter(
+            key__in=[add_prefix(key) for key in keys])
+            .values_list('key', 'value'))
+        sources = {key: deserialize_image_file(values[add_prefix(key)])
+                   for key in keys if add_prefix(key) in values}
+        live = live_images([source.name for source in sources.values()])
+        for key in keys:
+            source = sources.get(key)
+            if source is None:
+                yield StoredKey(key)
+            elif source.name not in live:
+                yield source
+
+
+def orphaned_thumbnail_files(batch_size=GC_BATCH_SIZE, min_age=GC_MIN_AGE):
+    """Файлы миниатюр, о которых не знает хранилище ключей."""
+    storage = default.storage
+    names = walk_files(storage, thumbnail_settings.THUMBNAIL_PREFIX, min_age)
+    for batch in batched(names, batch_size):
+        keys = {add_prefix(ImageFile(name, storage).key): name
+                for name in batch}
+        known = set(KVStore.objects.filter(key__in=list(keys))
+                    .values_list('key', flat=True))
+        yield from (name for key, name in keys.items() if key not in known)
+
+
+def collect_garbage(dry_run=False, batch_size=GC_BATCH_SIZE,
+                    min_age=GC_MIN_AGE, report=None):
+    """Удаляет осиротевшие картинки, миниатюры и записи о них.
+
+    Файлы и записи обходятся пачками, поэтому память не зависит от
+    размера MEDIA_ROOT. С dry_run ничего не удаляется, только
+    подсчитывается; report получает имя каждой найденной находки.
+    """
+    report = report or (lambda kind, name: None)
+    storage = Post._meta.get_field('image').storage
+    counts = {'images': 0, 'sources': 0, 'thumbnails': 0}
+    deadline = time.time() - min_age
+    for name in orphaned_images(batch_size, min_age):
+        if not dry_run and not still_orphaned(storage, name, deadline):
+            continue
+        report('images', name)
+        counts['images'] += 1
+        if not dry_run:
+            storage.delete(name)
+    for source in stale_thumbnail_sources(batch_size):
+        report('sources', getattr(source, 'name', source.key))
+        counts['sources'] += 1
+        if not dry_run:
+            default.kvstore.delete(source)
+    for name in orphaned_thumbnail_files(batch_size, min_age):
+        report('thumbnails', name)
+        counts['thumbnails'] += 1
+        if not dry_run:
+            default.storage.delete(name)
+    return counts
@@ -0,0 +1,96 @@
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Comment, Follow, Post, User, UserStats
+
+COUNTERS_BATCH_SIZE = 500
+
+USER_COUNTERS = (
+    ('posts_count', Post, 'author_id'),
+    ('followers_count', Follow, 'author_id'),
+    ('following_count', Follow, 'user_id'),
+)
+
+
+def shift(queryset, field, delta):
+    """Атомарно сдвигает счётчик на delta, не опуская его ниже нуля."""
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def change_user_counter(user_id, field, delta):
+    shift(UserStats.objects.filter(user_id=user_id), field, delta)
+
+
+def change_comment_count(post_id, delta):
+    shift(Post.objects.filter(pk=post_id), 'comment_count', delta)
+
+
+def grouped_counts(model, field, ids):
+    rows = (model.objects.filter(**{f'{field}__in': ids})
+            .order_by().values(field).annotate(total=Count('id'))
+            .values_list(field, 'total'))
+    return dict(rows)
+
+
+def reconcile_user_stats(batch_size=COUNTERS_BATCH_SIZE):
+    """Пересчитывает счётчики пользователей пачками, возвращает число
+    исправленных записей."""
+    repaired = 0
+    user_ids = User.objects.order_by('pk').values_list('pk', flat=True)
+    last_id = 0
+    while True:
+        ids = list(user_ids.filter(pk__gt=last_id)[:batch_size])
+        if not ids:
+            return repaired
+        last_id = ids[-1]
+        with transaction.atomic():
+            stats = {row.user_id: row for row in
+                     UserStats.objects.select_for_update()
+                     .filter(user_id__in=ids)}
+            counts = {field: grouped_counts(model, key, ids)
+                      for field, model, key in USER_COUNTERS}
+            missing, changed = [], []
+            for user_id in ids:
+                row = stats.get(user_id)
+                if row is None:
+                    row = UserStats(user_id=user_id)
+                    missing.append(row)
+                dirty = False
+                for field, _, _ in USER_COUNTERS:
+                    value = counts[field].get(user_id, 0)
+                    if getattr(row, field) != value:
+                        setattr(row, field, value)
+                        dirty = True
+                if dirty and row.pk is not None:
+                    changed.append(row)
+            UserStats.objects.bulk_create(missing, ignore_conflicts=True)
+            UserStats.objects.bulk_update(
+                changed, [field for field, _, _ in USER_COUNTERS])
+        repaired += len(missing) + len(changed)
+
+
+def reconcile_comment_counts(batch_size=COUNTERS_BATCH_SIZE):
+    """Пересчитывает Post.comment_count пачками, возвращает число
+    исправленных постов."""
+    repaired = 0
+    post_ids = Post.objects.order_by('pk').values_list('pk', flat=True)
+    last_id = 0
+    while True:
+        ids = list(post_ids.filter(pk__gt=last_id)[:batch_size])
+        if not ids:
+            return repaired
+        last_id = ids[-1]
+        with transaction.atomic():
+            batch = (Post.objects.select_for_update()
+                     .filter(pk__in=ids).only('pk', 'comment_count'))
+            counts = grouped_counts(Comment, 'post_id', ids)
+            changed = []
+            for post in batch:
+                value = counts.get(post.pk, 0)
+                if post.comment_count != value:
+                    post.comment_count = value
+                    changed.append(post)
+            Post.objects.bulk_update(changed, ['comment_count'])
+        repaired += len(changed)
@@ -0,0 +1,44 @@
+"""ETag страниц постов для условных GET-запросов.
+
+Считаются по поколениям лент из кэша и индексным выборкам id, поэтому
+ответ 304 отдаётся без выборки постов и отрисовки шаблонов.
+"""
+from .feed_cache import (INDEX_SCOPE, author_scope, feed_etag, follow_scope,
+                         followed_scopes, group_scope, post_scope)
+from .followees import followee_ids
+from .models import Group, Post, User
+
+
+def index_etag(request):
+    return feed_etag(request, INDEX_SCOPE)
+
+
+def group_etag(request, SlugField):
+    group_id = Group.objects.filter(
+        slug=SlugField).values_list('id', flat=True).first()
+    if group_id is not None:
+        return feed_etag(request, group_scope(group_id))
+
+
+def profile_etag(request, username):
+    user_id = User.objects.filter(
+        username=username).values_list('id', flat=True).first()
+    if user_id is not None:
+        return feed_etag(request, author_scope(user_id))
+
+
+def follow_etag(request):
+    return feed_etag(request, follow_scope(request.user.pk),
+                     *followed_scopes(followee_ids(request.user.pk)))
+
+
+def post_etag(request, post_id):
+    author_id = Post.objects.filter(
+        pk=post_id).values_list('author_id', flat=True).first()
+    if author_id is not None:
+        return feed_etag(request, post_scope(post_id),
+                         author_scope(author_id))
+
+
+def comment_etag(request, post_id, comment_id):
+    return post_etag(request, post_id)
@@ -0,0 +1,64 @@
+import csv
+import json
+
+from .models import Post
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_COLUMNS = (
+    ('id', 'id'),
+    ('pub_date', 'pub_date'),
+    ('author', 'author__username'),
+    ('group', 'group__slug'),
+    ('comment_count', 'comment_count'),
+    ('image', 'image'),
+    ('text', 'text'),
+)
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def export_rows(group=None, author=None, since=None, until=None):
+    """Строки выгрузки постов по фильтрам, читаемые с сервера пачками."""
+    posts = Post.objects.order_by('id')
+    if group is not None:
+        posts = posts.filter(group=group)
+    if author is not None:
+        posts = posts.filter(author=author)
+    if since is not None:
+        posts = posts.filter(pub_date__gte=since)
+    if until is not None:
+        posts = posts.filter(pub_date__lt=until)
+    rows = posts.values_list(*(field for _, field in EXPORT_COLUMNS))
+    return rows.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def ndjson_lines(rows):
+    names = [name for name, _ in EXPORT_COLUMNS]
+    for row in rows:
+        record = dict(zip(names, row))
+        record['pub_date'] = record['pub_date'].isoformat()
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+class Echo:
+    """Файл для csv.writer, возвращающий строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def export_lines(export_format, **filters):
+    """Генератор строк выгрузки в формате ndjson или csv."""
+    rows = export_rows(**filters)
+    if export_format == 'csv':
+        return csv_lines(rows)
+    return ndjson_lines(rows)
@@ -0,0 +1,59 @@
+from django.db import transaction
+
+from .models import FeedEntry, Follow, Post, User
+
+FEED_BATCH_SIZE = 1000
+
+
+def follower_ids(author_id):
+    return list(Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True))
+
+
+def fan_out_post(post, followers):
+    """Раскладывает новый пост в ленты подписчиков автора."""
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in followers),
+        batch_size=FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill_follow(follow):
+    """Добавляет в ленту подписчика уже опубликованные посты автора."""
+    posts = Post.objects.filter(
+        author_id=follow.author_id).values_list('id', 'pub_date')
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=follow.user_id, post_id=post_id,
+                   pub_date=pub_date)
+         for post_id, pub_date in posts.iterator()),
+        batch_size=FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def prune_follow(follow):
+    """Убирает из ленты подписчика посты автора после отписки."""
+    FeedEntry.objects.filter(
+        user_id=follow.user_id, post__author_id=follow.author_id).delete()
+
+
+def rebuild_feed(users=None):
+    """Пересобирает ленты пользователей (всех, если users не задан).
+
+    Лента каждого пользователя пересобирается в своей транзакции, поэтому
+    читатель видит её либо прежней, либо уже собранной, но не пустой.
+    """
+    if users is None:
+        user_ids = set(Follow.objects.values_list('user_id', flat=True))
+        user_ids.update(FeedEntry.objects.order_by().values_list(
+            'user_id', flat=True).distinct())
+    else:
+        user_ids = set(User.objects.filter(
+            pk__in=users).values_list('pk', flat=True))
+    for user_id in sorted(user_ids):
+        with transaction.atomic():
+            FeedEntry.objects.filter(user_id=user_id).delete()
+            for follow in Follow.objects.filter(user_id=user_id):
+                backfill_follow(follow)
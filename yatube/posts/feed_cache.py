@@ -0,0 +1,135 @@
+from hashlib import md5
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+from yatube.settings import (FEED_CACHE_TIMEOUT, FEED_COUNT_TIMEOUT,
+                             FEED_GENERATION_TIMEOUT)
+
+# поколение имён авторов и групп входит в ключ любой ленты
+NAMES_SCOPE = 'names'
+PAGE_PARAMS = ('page', 'after', 'before', 'order')
+
+
+def generation_key(scope):
+    return f'feed_generation:{scope}'
+
+
+def feed_generations(*scopes):
+    """Текущие поколения лент; пропавшие из кэша заменяются новыми."""
+    keys = [generation_key(scope) for scope in scopes]
+    generations = cache.get_many(keys)
+    missing = {key: uuid4().hex for key in keys if key not in generations}
+    if missing:
+        cache.set_many(missing, FEED_GENERATION_TIMEOUT)
+        generations.update(missing)
+    return [generations[key] for key in keys]
+
+
+def bump_feed_generation(*scopes):
+    """Делает устаревшими все закэшированные страницы лент scopes."""
+    cache.set_many({generation_key(scope): uuid4().hex for scope in scopes},
+                   FEED_GENERATION_TIMEOUT)
+
+
+INDEX_SCOPE = 'index'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def follow_scope(user_id):
+    return f'follow:{user_id}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def followed_scopes(author_ids):
+    """Ленты авторов, из которых собрана лента подписок.
+
+    Их поколения читаются при запросе ленты, поэтому новый пост или
+    комментарий меняет одно поколение автора, а не по ключу на каждого
+    подписчика.
+    """
+    return [author_scope(author_id) for author_id in author_ids]
+
+
+def post_scopes(post):
+    scopes = [INDEX_SCOPE, author_scope(post.author_id)]
+    if post.group_id is not None:
+        scopes.append(group_scope(post.group_id))
+    return scopes
+
+
+def count_key(scope):
+    return f'feed_count:{scope}'
+
+
+def get_feed_count(scope):
+    return cache.get(count_key(scope))
+
+
+def set_feed_count(scope, count):
+    cache.set(count_key(scope), count, FEED_COUNT_TIMEOUT)
+
+
+def follow_count_scope(user_id, author_ids):
+    """Ключ размера ленты подписок, меняющийся вместе с её поколениями."""
+    generations = feed_generations(follow_scope(user_id),
+                                   *followed_scopes(author_ids))
+    version = md5(':'.join(generations).encode()).hexdigest()
+    return f'{follow_scope(user_id)}:{version}'
+
+
+def shift_feed_counts(scopes, delta):
+    """Сдвигает закэшированные размеры лент, отсутствующие не создаёт."""
+    for scope in scopes:
+        try:
+            cache.incr(count_key(scope), delta)
+        except ValueError:
+            pass
+
+
+def forget_feed_counts(scopes):
+    """Сбрасывает размеры лент, изменившиеся на неизвестную величину."""
+    cache.delete_many([count_key(scope) for scope in scopes])
+
+
+def page_params(request):
+    return '&'.join(f'{param}={request.GET[param]}'
+                    for param in PAGE_PARAMS if param in request.GET)
+
+
+def feed_etag(request, *scopes):
+    """ETag страницы из поколений её лент, без обращения к шаблонам.
+
+    Учитывает зрителя: шапка и кнопка подписки зависят от него, а формы
+    страницы несут CSRF-токен, который меняется при каждом входе.
+    """
+    scopes += (NAMES_SCOPE,)
+    viewer = 'anonymous'
+    if request.user.is_authenticated:
+        viewer = str(request.user.pk)
+        scopes += (follow_scope(request.user.pk),)
+    csrf_token = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    raw = ':'.join((viewer, csrf_token, page_params(request),
+                    *feed_generations(*scopes)))
+    return md5(raw.encode()).hexdigest()
+
+
+def feed_cache_context(request, scope):
+    """Ключ и время жизни кэша фрагмента страницы ленты scope."""
+    return {
+        'feed_cache_key': ':'.join(
+            (scope, *feed_generations(scope, NAMES_SCOPE),
+             page_params(request))),
+        'feed_cache_timeout': FEED_CACHE_TIMEOUT,
+    }
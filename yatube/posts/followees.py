@@ -0,0 +1,64 @@
+"""Кэш подписок пользователя: отсортированный массив id авторов.
+
+Массив хранится в кэше как байты, проверка подписки — двоичный поиск,
+так что страницы профиля и подписки не обращаются к таблице Follow.
+Подписка и отписка правят закэшированный массив на месте.
+"""
+from array import array
+from bisect import bisect_left
+
+from django.core.cache import cache
+
+from yatube.settings import FOLLOWEES_TIMEOUT
+
+from .models import Follow
+
+FOLLOWEE_TYPECODE = 'q'
+
+
+def followees_key(user_id):
+    return f'followees:{user_id}'
+
+
+def unpack(raw):
+    ids = array(FOLLOWEE_TYPECODE)
+    ids.frombytes(raw)
+    return ids
+
+
+def followee_ids(user_id):
+    """Отсортированный массив id авторов, на которых подписан user_id."""
+    raw = cache.get(followees_key(user_id))
+    if raw is not None:
+        return unpack(raw)
+    ids = array(FOLLOWEE_TYPECODE, Follow.objects.filter(
+        user_id=user_id).order_by('author_id').values_list(
+            'author_id', flat=True))
+    cache.set(followees_key(user_id), ids.tobytes(), FOLLOWEES_TIMEOUT)
+    return ids
+
+
+def contains(ids, author_id):
+    index = bisect_left(ids, author_id)
+    return index < len(ids) and ids[index] == author_id
+
+
+def is_following(user_id, author_id):
+    return contains(followee_ids(user_id), author_id)
+
+
+def change_followees(user_id, author_id, followed):
+    """Добавляет автора в закэшированный массив или убирает из него."""
+    raw = cache.get(followees_key(user_id))
+    if raw is None:
+        return
+    ids = unpack(raw)
+    index = bisect_left(ids, author_id)
+    present = index < len(ids) and ids[index] == author_id
+    if followed == present:
+        return
+    if followed:
+        ids.insert(index, author_id)
+    else:
+        ids.pop(index)
+    cache.set(followees_key(user_id), ids.tobytes(), FOLLOWEES_TIMEOUT)
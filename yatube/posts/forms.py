@@ -1,6 +1,11 @@
 from django import forms
 
-from .models import Comment, Post
+from yatube.settings import COMMENT_MAX_DEPTH, UPLOAD_MAX_SIZE
+
+from .export import EXPORT_FORMATS
+from .images import fill_image_metadata, validate_image_size
+from .models import Comment, Group, Post, UploadSession, User
+from .uploads import AssembledUpload, discard_upload, find_upload
 
 
 class PostForm(forms.ModelForm):
@@ -9,9 +14,64 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image',)
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, uploader=None, **kwargs):
         super(PostForm, self).__init__(*args, **kwargs)
         self.fields['group'].required = False
+        # картинка, загруженная по кускам, подставляется вместо файла
+        self.upload = None
+        self.upload_id = self.data.get('upload')
+        if (self.upload_id and uploader is not None
+                and not self.files.get('image')):
+            self.upload = find_upload(self.upload_id, uploader)
+            if self.upload is not None and self.upload.complete:
+                self.files = self.files.copy()
+                self.files['image'] = AssembledUpload(self.upload)
+
+    def full_clean(self):
+        super().full_clean()
+        # проверка читала собранный файл; сохранение откроет его заново
+        if self.upload is not None and 'image' in self.files:
+            self.files['image'].close()
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.upload_id and not self.files.get('image'):
+            self.add_error('image', 'Загрузка картинки не завершена')
+        return cleaned_data
+
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        # у только что загруженного файла форма уже прочитала заголовок
+        header = getattr(image, 'image', None)
+        if header is not None:
+            validate_image_size(header)
+        return image
+
+    def save(self, commit=True):
+        if 'image' in self.changed_data:
+            fill_image_metadata(self.instance, self.cleaned_data['image'])
+        return super().save(commit)
+
+    def discard_upload(self):
+        """Удаляет сессию загрузки, картинка из которой уже сохранена."""
+        if self.upload is not None:
+            self.files['image'].close()
+            discard_upload(self.upload)
+
+
+class UploadForm(forms.ModelForm):
+
+    class Meta:
+        model = UploadSession
+        fields = ('filename', 'size')
+
+    def clean_size(self):
+        size = self.cleaned_data['size']
+        if not 0 < size <= UPLOAD_MAX_SIZE:
+            raise forms.ValidationError(
+                f'Размер файла должен быть от 1 до {UPLOAD_MAX_SIZE} байт',
+                code='upload_size')
+        return size
 
 
 class CommentForm(forms.ModelForm):
@@ -19,3 +79,39 @@ class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
         fields = ('text',)
+
+
+class ReplyForm(CommentForm):
+    """Комментарий, который может быть ответом на другой."""
+
+    class Meta(CommentForm.Meta):
+        fields = ('text', 'parent')
+        widgets = {'parent': forms.HiddenInput}
+
+    def __init__(self, *args, post=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # отвечать можно только на комментарии того же поста
+        self.fields['parent'].queryset = (
+            post.comments.all() if post is not None
+            else Comment.objects.none())
+
+    def clean_parent(self):
+        parent = self.cleaned_data['parent']
+        # ответ на слишком глубокий комментарий становится соседним с ним
+        if parent is not None and parent.depth >= COMMENT_MAX_DEPTH:
+            parent = parent.parent
+        return parent
+
+
+class ExportForm(forms.Form):
+    format = forms.ChoiceField(
+        choices=[(name, name) for name in EXPORT_FORMATS], required=False)
+    group = forms.ModelChoiceField(
+        Group.objects.all(), to_field_name='slug', required=False)
+    author = forms.ModelChoiceField(
+        User.objects.all(), to_field_name='username', required=False)
+    since = forms.DateTimeField(required=False)
+    until = forms.DateTimeField(required=False)
+
+    def clean_format(self):
+        return self.cleaned_data['format'] or 'ndjson'
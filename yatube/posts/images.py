@@ -0,0 +1,138 @@
+import hashlib
+from base64 import b64encode
+from io import BytesIO
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from yatube.settings import IMAGE_MAX_PIXELS, IMAGE_MAX_SIDE
+
+IMAGE_METADATA_FIELDS = ('image_width', 'image_height', 'image_size',
+                         'image_format', 'image_hash')
+# сведения в image.info, которые не должны попасть в сохранённый оригинал
+METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment')
+SAVE_OPTIONS = {'JPEG': {'quality': 85, 'optimize': True},
+                'PNG': {'optimize': True}}
+PLACEHOLDER_FIELDS = ('image_color', 'image_placeholder')
+# размер заглушки примерно в пропорциях карточки 960×339
+PLACEHOLDER_SIZE = (20, 7)
+EMPTY_METADATA = {'image_width': None, 'image_height': None,
+                  'image_size': None, 'image_format': '', 'image_hash': '',
+                  'image_color': '', 'image_placeholder': ''}
+
+
+def content_hash(file_):
+    """SHA-256 содержимого файла, прочитанного по кускам."""
+    digest = hashlib.sha256()
+    for chunk in file_.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def image_metadata(file_):
+    """Размеры, вес, формат и хеш картинки.
+
+    Pillow читает только заголовок, а хеш считается потоково, поэтому
+    файл целиком в память не попадает. Загруженный через форму файл уже
+    открыт при проверке, и его картинка используется повторно.
+    """
+    image = getattr(file_, 'image', None)
+    if image is None:
+        file_.seek(0)
+        image = Image.open(file_)
+    return {
+        'image_width': image.width,
+        'image_height': image.height,
+        'image_size': file_.size,
+        'image_format': image.format or '',
+        'image_hash': content_hash(file_),
+    }
+
+
+def fill_image_metadata(post, file_):
+    """Записывает в пост сведения о картинке или очищает их.
+
+    Заглушку новой картинки потом готовит фоновое задание.
+    """
+    metadata = dict(EMPTY_METADATA)
+    if file_:
+        metadata.update(image_metadata(file_))
+    for field, value in metadata.items():
+        setattr(post, field, value)
+
+
+def image_placeholder(file_):
+    """Средний цвет и крошечная копия картинки для показа до загрузки.
+
+    Копия в PNG размером PLACEHOLDER_SIZE занимает пару сотен байт и
+    встраивается в страницу как data URI, а браузер растягивает её в
+    размытое превью.
+    """
+    file_.seek(0)
+    with Image.open(file_) as image:
+        image.draft('RGB', PLACEHOLDER_SIZE)
+        tiny = ImageOps.fit(ImageOps.exif_transpose(image).convert('RGB'),
+                            PLACEHOLDER_SIZE, Image.BOX)
+    color = tiny.resize((1, 1), Image.BOX).getpixel((0, 0))
+    buffer = BytesIO()
+    tiny.save(buffer, 'PNG', optimize=True)
+    return {
+        'image_color': '#%02x%02x%02x' % color,
+        'image_placeholder': ('data:image/png;base64,'
+                              + b64encode(buffer.getvalue()).decode()),
+    }
+
+
+def stored_image_metadata(name):
+    """Сведения о картинке, уже лежащей в хранилище, вместе с
+    заглушкой."""
+    with default_storage.open(name) as file_:
+        return {**image_metadata(file_), **image_placeholder(file_)}
+
+
+def validate_image_size(image):
+    """Отклоняет картинку, которую опасно раскодировать целиком.
+
+    Размер берётся из заголовка, который форма уже прочитала, так что
+    пиксели на этом шаге не раскодируются.
+    """
+    width, height = image.size
+    if width * height > IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка слишком большая: %(width)s×%(height)s, допустимо '
+            'не больше %(limit)s мегапикселей.',
+            code='too_many_pixels',
+            params={'width': width, 'height': height,
+                    'limit': IMAGE_MAX_PIXELS // 1000000},
+        )
+
+
+def normalized_image(file_):
+    """Копия картинки для хранения или None, если оригинал подходит.
+
+    Копия повёрнута по EXIF, лишена метаданных и уменьшена до
+    IMAGE_MAX_SIDE по большей стороне. JPEG раскодируется сразу в
+    уменьшенном виде (draft), что ограничивает расход памяти. Анимацию
+    не трогаем: сохранился бы только первый кадр.
+    """
+    file_.seek(0)
+    with Image.open(file_) as image:
+        if getattr(image, 'is_animated', False):
+            return None
+        has_metadata = (any(key in image.info for key in METADATA_KEYS)
+                        or len(image.getexif()))
+        if not has_metadata and max(image.size) <= IMAGE_MAX_SIDE:
+            return None
+        format_ = image.format
+        icc_profile = image.info.get('icc_profile')
+        image.draft(image.mode, (IMAGE_MAX_SIDE, IMAGE_MAX_SIDE))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE))
+        buffer = BytesIO()
+        options = dict(SAVE_OPTIONS.get(format_, {}), exif=b'')
+        if icc_profile:
+            options['icc_profile'] = icc_profile
+        image.save(buffer, format_, **options)
+    return ContentFile(buffer.getvalue())
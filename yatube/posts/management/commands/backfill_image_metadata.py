@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from posts.images import (IMAGE_METADATA_FIELDS, PLACEHOLDER_FIELDS,
+                          stored_image_metadata)
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Заполняет размеры, формат, хеш и заглушки картинок уже '
+            'созданных постов')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Сколько постов сохранять одним запросом')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        posts = (Post.objects.exclude(image='')
+                 .filter(Q(image_hash='') | Q(image_placeholder=''))
+                 .only('id', 'image').order_by('pk')
+                 .iterator(chunk_size=batch_size))
+        batch, filled, missing = [], 0, 0
+        for post in posts:
+            try:
+                metadata = stored_image_metadata(post.image.name)
+            except OSError:
+                missing += 1
+                continue
+            for field, value in metadata.items():
+                setattr(post, field, value)
+            batch.append(post)
+            if len(batch) == batch_size:
+                filled += self.save(batch)
+        filled += self.save(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Заполнено постов: {filled}, файлов не найдено: {missing}'))
+
+    def save(self, batch):
+        Post.objects.bulk_update(
+            batch, IMAGE_METADATA_FIELDS + PLACEHOLDER_FIELDS)
+        saved = len(batch)
+        batch.clear()
+        return saved
@@ -0,0 +1,42 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.models import Post
+from posts.thumbnails import (build_variants, generate_thumbnails,
+                              source_image, thumbnails_ready)
+
+
+class Command(BaseCommand):
+    help = 'Создаёт недостающие варианты картинок постов в пуле процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=None,
+            help='Сколько процессов запускать (по умолчанию по числу ядер, '
+                 '1 — без пула)')
+        parser.add_argument(
+            '--chunk-size', type=int, default=20,
+            help='Сколько картинок отдавать процессу за раз')
+
+    def handle(self, *args, **options):
+        names = list(
+            Post.objects.exclude(image='').order_by()
+            .values_list('image', flat=True).distinct())
+        if options['processes'] == 1:
+            for name in names:
+                generate_thumbnails(source_image(name))
+        else:
+            # дочерние процессы открывают собственные соединения с БД
+            connections.close_all()
+            with ProcessPoolExecutor(options['processes']) as pool:
+                for _ in pool.map(build_variants, names,
+                                  chunksize=options['chunk_size']):
+                    pass
+        posts = Post.objects.exclude(image='').only(
+            'id', 'author_id', 'group_id', 'image')
+        for post in posts.iterator():
+            thumbnails_ready(post)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {len(names)}'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from posts.cleanup import GC_BATCH_SIZE, GC_MIN_AGE, collect_garbage
+
+
+class Command(BaseCommand):
+    help = ('Удаляет картинки без постов, миниатюры удалённых картинок '
+            'и их записи в хранилище ключей')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет удалено')
+        parser.add_argument(
+            '--batch-size', type=int, default=GC_BATCH_SIZE,
+            help='Сколько имён сверять с базой за один запрос')
+        parser.add_argument(
+            '--min-age', type=int, default=GC_MIN_AGE,
+            help='Не трогать файлы моложе стольких секунд')
+
+    def handle(self, *args, **options):
+        def report(kind, name):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{kind}: {name}')
+
+        counts = collect_garbage(
+            dry_run=options['dry_run'], batch_size=options['batch_size'],
+            min_age=options['min_age'], report=report)
+        action = 'Найдено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action}: картинок {counts["images"]}, '
+            f'исходников миниатюр {counts["sources"]}, '
+            f'файлов миниатюр {counts["thumbnails"]}'))
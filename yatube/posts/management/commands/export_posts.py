@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.export import EXPORT_FORMATS, export_lines
+from posts.forms import ExportForm
+
+
+class Command(BaseCommand):
+    help = 'Потоково выгружает посты в формате NDJSON или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=list(EXPORT_FORMATS),
+                            default='ndjson')
+        parser.add_argument('--group', help='Адрес (slug) группы')
+        parser.add_argument('--author', help='Имя автора')
+        parser.add_argument('--since', help='Не раньше даты и времени')
+        parser.add_argument('--until', help='Раньше даты и времени')
+
+    def handle(self, *args, **options):
+        form = ExportForm({
+            name: options[name]
+            for name in ('format', 'group', 'author', 'since', 'until')
+            if options[name] is not None
+        })
+        if not form.is_valid():
+            raise CommandError(form.errors.as_text())
+        filters = form.cleaned_data
+        for line in export_lines(filters.pop('format'), **filters):
+            self.stdout.write(line, ending='')
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.storage import is_hashed
+
+CHUNK_SIZE = 200
+
+
+class Command(BaseCommand):
+    help = ('Переносит картинки постов в хранилище с именами по хешу '
+            'содержимого')
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        posts = (Post.objects.exclude(image='')
+                 .only('id', 'author_id', 'group_id', 'image')
+                 .order_by('pk').iterator(chunk_size=CHUNK_SIZE))
+        moved, missing = 0, 0
+        for post in posts:
+            old_name = post.image.name
+            if is_hashed(old_name):
+                continue
+            try:
+                with storage.open(old_name) as content:
+                    new_name = storage.save(old_name, content)
+            except OSError:
+                missing += 1
+                continue
+            post.image.name = new_name
+            post.image_hash = new_name.rsplit('/', 1)[-1].split('.')[0]
+            # сигналы сбрасывают кеш лент, освобождают старый файл и
+            # ставят задание на миниатюры
+            post.save(update_fields=['image', 'image_hash'])
+            moved += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено картинок: {moved}, файлов не найдено: {missing}. '
+            f'Миниатюры создаст команда process_thumbnails'))
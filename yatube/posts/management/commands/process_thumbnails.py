@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts.thumbnails import process_pending_jobs
+
+
+class Command(BaseCommand):
+    help = 'Создаёт миниатюры по накопившимся заданиям очереди'
+
+    def handle(self, *args, **options):
+        processed = process_pending_jobs()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано заданий: {processed}'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts.uploads import purge_stale_uploads
+from yatube.settings import UPLOAD_SESSION_TTL
+
+
+class Command(BaseCommand):
+    help = 'Удаляет брошенные сессии загрузки картинок по кускам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ttl', type=int, default=UPLOAD_SESSION_TTL,
+            help='Сколько секунд без новых кусков сессия считается живой')
+
+    def handle(self, *args, **options):
+        purged = purge_stale_uploads(options['ttl'])
+        self.stdout.write(self.style.SUCCESS(f'Удалено сессий: {purged}'))
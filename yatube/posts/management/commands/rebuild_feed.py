@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts.feed import rebuild_feed
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Пользователи, чьи ленты пересобрать (по умолчанию все)')
+
+    def handle(self, *args, **options):
+        users = None
+        if options['usernames']:
+            users = User.objects.filter(username__in=options['usernames'])
+        rebuild_feed(users)
+        self.stdout.write(self.style.SUCCESS('Ленты подписок пересобраны'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import (COUNTERS_BATCH_SIZE, reconcile_comment_counts,
+                            reconcile_user_stats)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики постов и подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=COUNTERS_BATCH_SIZE,
+            help='Сколько записей пересчитывать за одну транзакцию')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        users = reconcile_user_stats(batch_size)
+        posts = reconcile_comment_counts(batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счётчиков: пользователей {users}, постов {posts}'))
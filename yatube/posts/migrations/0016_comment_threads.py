@@ -0,0 +1,53 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BATCH_SIZE = 500
+
+
+def fill_paths(apps, schema_editor):
+    # все существующие комментарии — корни своих веток; в память
+    # читается не больше пачки за раз
+    Comment = apps.get_model('posts', 'Comment')
+    last_id = 0
+    while True:
+        comments = list(Comment.objects.filter(id__gt=last_id)
+                        .order_by('id').only('id')[:BATCH_SIZE])
+        if not comments:
+            break
+        for comment in comments:
+            comment.path = '{:08x}'.format(comment.id)
+        Comment.objects.bulk_update(comments, ['path'])
+        last_id = comments[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Глубина'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='posts.Comment', verbose_name='Ответ на'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=255, verbose_name='Путь в ветке'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
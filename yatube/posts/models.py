@@ -1,7 +1,16 @@
+import uuid
+
 from core.models import CreatedModel
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from .storage import ContentAddressedStorage
+
+# сегмент материализованного пути: id комментария в фиксированной ширине,
+# чтобы сортировка по строке пути давала обход дерева в глубину
+PATH_SEGMENT = '{:08x}'
+PATH_SEGMENT_LENGTH = 8
+
 User = get_user_model()
 
 
@@ -36,12 +45,42 @@ class Post(CreatedModel):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True,
         help_text='Выберите картинку'
     )
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки', null=True, editable=False)
+    image_height = models.PositiveIntegerField(
+        'Высота картинки', null=True, editable=False)
+    image_size = models.PositiveIntegerField(
+        'Размер картинки в байтах', null=True, editable=False)
+    image_format = models.CharField(
+        'Формат картинки', max_length=10, blank=True, editable=False)
+    image_hash = models.CharField(
+        'SHA-256 картинки', max_length=64, blank=True, editable=False)
+    image_color = models.CharField(
+        'Средний цвет картинки', max_length=7, blank=True, editable=False)
+    image_placeholder = models.TextField(
+        'Заглушка картинки', blank=True, editable=False,
+        help_text='Крошечная копия картинки в виде data URI')
+    comment_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_idx'),
+            models.Index(fields=['image'], name='post_image_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.text[:15]
@@ -61,10 +100,42 @@ class Comment(CreatedModel):
     )
     text = models.TextField('Текст комментария',
                             help_text='Введите текст комментария')
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name='replies',
+        verbose_name='Ответ на',
+    )
+    path = models.CharField('Путь в ветке', max_length=255, default='',
+                            editable=False)
+    depth = models.PositiveSmallIntegerField('Глубина', default=0,
+                                             editable=False)
+
+    class Meta:
+        ordering = ('pub_date',)
+        indexes = [
+            models.Index(fields=['post', 'pub_date'],
+                         name='comment_post_pub_date_idx'),
+            models.Index(fields=['post', 'path'],
+                         name='comment_post_path_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if not self.path:
+            # путь продолжает путь родителя id самого комментария,
+            # который известен только после вставки
+            prefix = self.parent.path if self.parent_id else ''
+            self.path = prefix + PATH_SEGMENT.format(self.pk)
+            self.depth = len(self.path) // PATH_SEGMENT_LENGTH - 1
+            Comment.objects.filter(pk=self.pk).update(path=self.path,
+                                                      depth=self.depth)
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -87,6 +158,96 @@ class Follow(models.Model):
             models.CheckConstraint(check=~models.Q(user=models.F('author')),
                                    name='user_not_author')
         ]
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.user.username
+
+
+class FeedEntry(models.Model):
+    """Материализованная лента подписок: пост у каждого подписчика."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пользователь',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date', '-post_id')
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='one_feed_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='feed_user_pub_date_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.user} <- {self.post_id}'
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    def __str__(self) -> str:
+        return str(self.user)
+
+
+class ThumbnailJob(CreatedModel):
+    """Постоянная очередь генерации миниатюр картинки поста."""
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='thumbnail_job',
+        verbose_name='Пост',
+    )
+    # задание снимается, только если картинка с тех пор не сменилась
+    image = models.CharField('Картинка', max_length=100, default='')
+
+    def __str__(self) -> str:
+        return str(self.post_id)
+
+
+class UploadSession(models.Model):
+    """Картинка, которую клиент загружает по кускам."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4,
+                          editable=False)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions',
+        verbose_name='Пользователь',
+    )
+    filename = models.CharField('Имя файла', max_length=100)
+    size = models.PositiveIntegerField('Размер файла')
+    offset = models.PositiveIntegerField('Получено байт', default=0)
+    updated = models.DateTimeField('Последний кусок', auto_now=True,
+                                   db_index=True)
+
+    @property
+    def complete(self):
+        return self.offset == self.size
+
+    def __str__(self) -> str:
+        return f'{self.filename}: {self.offset}/{self.size}'
@@ -0,0 +1,250 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.core.paginator import (EmptyPage, Page, PageNotAnInteger,
+                                   Paginator)
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from yatube.settings import (COMMENTS_ON_THE_PAGE, FEED_COUNT_ESTIMATE,
+                             FEED_COUNT_ESTIMATE_LIMIT, POSTS_ON_THE_PAGES)
+
+from .feed_cache import get_feed_count, set_feed_count
+from .threads import attach_replies
+
+FEED_KEY = ('pub_date', 'id')
+# id из курсора сравнивается с первичным ключом: больше 64 бит база не примет
+MAX_CURSOR_ID = 2 ** 63 - 1
+COMMENT_ORDERS = {'old': False, 'new': True}
+
+
+def encode_cursor(row, key=FEED_KEY):
+    """Непрозрачный токен позиции строки в ленте: (pub_date, id)."""
+    date_field, id_field = key
+    raw = f'{getattr(row, date_field).isoformat()}|{getattr(row, id_field)}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Разбирает токен курсора, для испорченного токена возвращает None.
+
+    encode_cursor пишет дату с часовым поясом и id строки, поэтому дата
+    без пояса или id вне диапазона первичного ключа тоже считаются порчей.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        pub_date, pk = raw.decode().split('|')
+        pub_date = datetime.fromisoformat(pub_date)
+        pk = int(pk)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        return None
+    if pub_date.tzinfo is None or not 1 <= pk <= MAX_CURSOR_ID:
+        return None
+    return pub_date, pk
+
+
+def key_ordering(key, descending=True):
+    return tuple(f'-{field}' if descending else field for field in key)
+
+
+class CursorPaginator(Paginator):
+    """Курсорный пагинатор по ключу (pub_date, id).
+
+    Страница выбирается диапазонным запросом от курсора вместо OFFSET,
+    а наличие соседних страниц определяется по лишней строке выборки,
+    поэтому COUNT(*) по всей ленте не выполняется. По умолчанию идёт
+    от новых строк к старым, с descending=False — наоборот.
+    """
+    keyset = True
+
+    def __init__(self, object_list, per_page, key=FEED_KEY, descending=True,
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.key = key
+        self.descending = descending
+        self.has_next = False
+        self.has_previous = False
+
+    @property
+    def number(self):
+        return 2 if self.has_previous else 1
+
+    @property
+    def num_pages(self):
+        """Номер последней известной страницы окна — без COUNT(*)."""
+        return self.number + 1 if self.has_next else self.number
+
+    def _seek(self, cursor, forward):
+        date_field, id_field = self.key
+        pub_date, pk = cursor
+        lookup = 'lt' if forward == self.descending else 'gt'
+        return (Q(**{f'{date_field}__{lookup}': pub_date})
+                | Q(**{date_field: pub_date, f'{id_field}__{lookup}': pk}))
+
+    def _rows_after(self, posts, cursor):
+        if cursor is not None:
+            posts = posts.filter(self._seek(cursor, True))
+        rows = list(posts[:self.per_page + 1])
+        self.has_next = len(rows) > self.per_page
+        self.has_previous = cursor is not None
+        return rows[:self.per_page]
+
+    def _rows_before(self, posts, cursor):
+        posts = posts.filter(self._seek(cursor, False))
+        rows = list(posts.reverse()[:self.per_page + 1])
+        self.has_next = True
+        self.has_previous = len(rows) > self.per_page
+        return rows[:self.per_page][::-1]
+
+    def get_page(self, after=None, before=None):
+        """Возвращает страницу после курсора after или перед before."""
+        posts = self.object_list.order_by(
+            *key_ordering(self.key, self.descending))
+        cursor = decode_cursor(before) if before else None
+        if cursor is not None:
+            rows = self._rows_before(posts, cursor)
+        else:
+            cursor = decode_cursor(after) if after else None
+            rows = self._rows_after(posts, cursor)
+        page = self._get_page(rows, self.number, self)
+        page.next_cursor = (encode_cursor(rows[-1], self.key)
+                            if self.has_next and rows else None)
+        page.previous_cursor = (encode_cursor(rows[0], self.key)
+                                if self.has_previous and rows else None)
+        return page
+
+
+class EstimatedPage(Page):
+    """Страница ленты, длина которой только оценена.
+
+    Следующая страница есть, если при выборке нашлась лишняя строка, а
+    не потому, что номер меньше оценённого числа страниц.
+    """
+
+    def __init__(self, object_list, number, paginator, more):
+        super().__init__(object_list, number, paginator)
+        self.more = more
+
+    def has_next(self):
+        return self.more
+
+
+class CachedCountPaginator(Paginator):
+    """Нумерованный пагинатор, берущий размер ленты scope из кэша.
+
+    Закэшированный размер сдвигается сигналами при создании и удалении
+    постов и пересчитывается по истечении FEED_COUNT_TIMEOUT. В режиме
+    estimate при промахе кэша строки считаются не дальше
+    FEED_COUNT_ESTIMATE_LIMIT, а более длинная лента помечается
+    флагом estimated: её страницы листаются и за оценённым концом.
+    """
+
+    ELLIPSIS = '…'
+
+    def __init__(self, object_list, per_page, scope,
+                 estimate=FEED_COUNT_ESTIMATE, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.scope = scope
+        self.estimate = estimate
+        self.estimated = False
+
+    @cached_property
+    def count(self):
+        count = get_feed_count(self.scope)
+        if count is not None:
+            return count
+        if self.estimate:
+            limit = FEED_COUNT_ESTIMATE_LIMIT
+            count = self.object_list[:limit + 1].count()
+            if count > limit:
+                self.estimated = True
+                return limit
+        else:
+            count = super().count
+        set_feed_count(self.scope, count)
+        return count
+
+    def validate_number(self, number):
+        if not (self.count and self.estimated):
+            return super().validate_number(number)
+        # настоящий конец ленты дальше оценки, его найдёт page()
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы — не целое число')
+        if number < 1:
+            raise EmptyPage('Номер страницы меньше 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.estimated:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows:
+            raise EmptyPage('Страница пуста')
+        return EstimatedPage(rows[:self.per_page], number, self,
+                             more=len(rows) > self.per_page)
+
+    def get_elided_page_range(self, number=1, on_each_side=3, on_ends=2):
+        """Номера страниц вокруг текущей и по краям, пропуски — ELLIPSIS.
+
+        Перенесено из Django 3.2: число ссылок не зависит от длины ленты.
+        """
+        number = self.validate_number(number)
+        if self.num_pages <= (on_each_side + on_ends) * 2:
+            yield from self.page_range
+            return
+        if number > (1 + on_each_side + on_ends) + 1:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < (self.num_pages - on_each_side - on_ends) - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(self.num_pages - on_ends + 1, self.num_pages + 1)
+        else:
+            yield from range(number + 1, self.num_pages + 1)
+
+    def get_page(self, number):
+        page = super().get_page(number)
+        page.elided_page_range = list(
+            self.get_elided_page_range(page.number))
+        return page
+
+
+def paginate(request, posts, scope, key=FEED_KEY):
+    """Страница ленты: ?page=N — нумерованная, иначе курсорная."""
+    page_number = request.GET.get('page')
+    if page_number is not None:
+        paginator = CachedCountPaginator(posts.order_by(*key_ordering(key)),
+                                         POSTS_ON_THE_PAGES, scope)
+        return paginator.get_page(page_number)
+    return CursorPaginator(posts, POSTS_ON_THE_PAGES, key=key).get_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+
+
+def paginate_comments(request, post):
+    """Страница веток комментариев поста вместе с авторами.
+
+    Листаются корневые комментарии: ?order=new показывает сначала новые,
+    иначе — старые; следующая порция выбирается по курсору ?after.
+    Ответы каждого корня подвешиваются к нему целиком.
+    """
+    order = request.GET.get('order')
+    if order not in COMMENT_ORDERS:
+        order = 'old'
+    comments = post.comments.filter(parent=None).select_related('author')
+    page = CursorPaginator(
+        comments, COMMENTS_ON_THE_PAGE,
+        descending=COMMENT_ORDERS[order]).get_page(
+            after=request.GET.get('after'))
+    attach_replies(page.object_list)
+    page.order = order
+    return page
@@ -0,0 +1,145 @@
+import time
+from threading import local
+
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from .counters import change_comment_count, change_user_counter
+from .feed import backfill_follow, fan_out_post, follower_ids, prune_follow
+from .feed_cache import (NAMES_SCOPE, author_scope, bump_feed_generation,
+                         follow_scope, forget_feed_counts, post_scope,
+                         post_scopes, shift_feed_counts)
+from .followees import change_followees
+from .models import Comment, Follow, Group, Post, User, UserStats
+from .thumbnails import enqueue_thumbnails, release_image
+from .timelines import forget_timeline, push_timeline
+
+
+class DeletingPosts(local):
+    """id постов, которые удаляются в этом потоке прямо сейчас."""
+
+    def __init__(self):
+        self.ids = set()
+
+
+deleting_posts = DeletingPosts()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+    elif update_fields is None or set(update_fields) - {'last_login'}:
+        bump_feed_generation(NAMES_SCOPE)
+
+
+@receiver(pre_save, sender=Post)
+def post_moving(sender, instance, **kwargs):
+    if instance.pk is None:
+        return
+    old = Post.objects.filter(pk=instance.pk).only(
+        'author_id', 'group_id', 'image').first()
+    if old is None:
+        return
+    if post_scopes(old) != post_scopes(instance):
+        bump_feed_generation(*post_scopes(old))
+        forget_feed_counts(post_scopes(old) + post_scopes(instance))
+    if old.image.name != instance.image.name:
+        # пустое имя значит, что картинки раньше не было
+        instance.replaced_image = old.image.name
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        change_user_counter(instance.author_id, 'posts_count', 1)
+        shift_feed_counts(post_scopes(instance), 1)
+        fan_out_post(instance, follower_ids(instance.author_id))
+        # до коммита пост не виден другим соединениям, а откат оставил бы
+        # его в закэшированной ленте
+        transaction.on_commit(lambda: push_timeline(instance))
+    # ленты подписчиков читают поколение автора сами, см. followed_scopes
+    bump_feed_generation(*post_scopes(instance), post_scope(instance.id))
+    replaced = instance.__dict__.pop('replaced_image', None)
+    if created or replaced is not None:
+        # любой путь записи — форма, админка, команды — получает миниатюры
+        enqueue_thumbnails(instance)
+    if replaced:
+        since = time.time()
+        transaction.on_commit(lambda: release_image(replaced, since))
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    deleting_posts.ids.add(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    deleting_posts.ids.discard(instance.pk)
+    change_user_counter(instance.author_id, 'posts_count', -1)
+    shift_feed_counts(post_scopes(instance), -1)
+    transaction.on_commit(lambda: forget_timeline(instance.author_id))
+    bump_feed_generation(*post_scopes(instance), post_scope(instance.id))
+    if instance.image:
+        name, since = instance.image.name, time.time()
+        transaction.on_commit(lambda: release_image(name, since))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        change_comment_count(instance.post_id, 1)
+    comment_changed(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    if instance.post_id in deleting_posts.ids:
+        # комментарии уходят вместе с постом: его счётчик не нужен, а
+        # ленты сбросит удаление самого поста
+        return
+    change_comment_count(instance.post_id, -1)
+    comment_changed(instance)
+
+
+def comment_changed(comment):
+    # число комментариев выводится в закэшированных страницах всех лент,
+    # где есть пост
+    post = comment.post
+    bump_feed_generation(*post_scopes(post), post_scope(post.id))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        change_user_counter(instance.author_id, 'followers_count', 1)
+        change_user_counter(instance.user_id, 'following_count', 1)
+        backfill_follow(instance)
+        transaction.on_commit(lambda: change_followees(
+            instance.user_id, instance.author_id, True))
+        follow_changed(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    change_user_counter(instance.author_id, 'followers_count', -1)
+    change_user_counter(instance.user_id, 'following_count', -1)
+    prune_follow(instance)
+    transaction.on_commit(lambda: change_followees(
+        instance.user_id, instance.author_id, False))
+    follow_changed(instance)
+
+
+def follow_changed(follow):
+    # новое поколение ленты подписок меняет и ключ её размера
+    bump_feed_generation(follow_scope(follow.user_id),
+                         author_scope(follow.author_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    bump_feed_generation(NAMES_SCOPE)
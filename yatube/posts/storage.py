@@ -0,0 +1,50 @@
+import os
+import re
+import time
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+from .images import content_hash
+
+# posts/ab/cd/<sha256>.<расширение>
+HASHED_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файлы под именем из хеша содержимого.
+
+    Файл с хешем abcd… ложится в <каталог>/ab/cd/abcd….<расширение>:
+    два уровня каталогов держат их размер небольшим, а одинаковые
+    загрузки получают одно имя и хранятся один раз. Файл удаляется, когда
+    на него не остаётся ссылок (см. release_image).
+    """
+
+    def hashed_name(self, name, content):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        digest = content_hash(content)
+        return os.path.join(directory, digest[:2], digest[2:4],
+                            digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            try:
+                # новая ссылка на файл появится в базе позже: свежее время
+                # изменения не даёт сборщику мусора и release_image удалить
+                # его в этом промежутке; время задаётся явно, потому что
+                # ядро ставит его по грубым часам, отстающим от time.time()
+                now = time.time()
+                os.utime(self.path(name), (now, now))
+                return name
+            except FileNotFoundError:
+                pass
+        return super().save(name, content, max_length)
+
+
+def is_hashed(name):
+    return bool(HASHED_NAME.search(name))
@@ -0,0 +1,42 @@
+from django import template
+
+from posts.thumbnails import IMAGE_SIZES, image_sources
+from posts.thumbnails import cached_thumbnail as find_thumbnail
+from posts.thumbnails import prefetch_thumbnails as load_thumbnails
+
+register = template.Library()
+
+
+def placeholder_style(post):
+    """CSS-фон с заглушкой картинки поста."""
+    if not post.image_color:
+        return ''
+    style = f'background: {post.image_color}'
+    if post.image_placeholder:
+        style += f' url({post.image_placeholder}) center / cover no-repeat'
+    return style
+
+
+@register.simple_tag
+def cached_thumbnail(image, geometry_string, **options):
+    """Готовая миниатюра или None — без генерации во время запроса."""
+    return find_thumbnail(image, geometry_string, **options)
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts):
+    """Подгружает миниатюры всей страницы одним обращением к кешу."""
+    load_thumbnails(posts)
+    return ''
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def responsive_image(post, eager=False):
+    """Разметка <picture> с вариантами картинки разной ширины и формата.
+
+    Картинки ниже первого экрана (eager=False) грузятся лениво, а до
+    загрузки на их месте видна заглушка поста.
+    """
+    return {'post': post, 'sources': image_sources(post.image),
+            'sizes': IMAGE_SIZES, 'eager': eager,
+            'placeholder': placeholder_style(post)}
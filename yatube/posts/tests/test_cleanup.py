@@ -0,0 +1,94 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from sorl.thumbnail import default
+from sorl.thumbnail.models import KVStore
+
+from ..cleanup import collect_garbage
+from ..models import Post, User
+from ..thumbnails import (THUMBNAIL_GEOMETRIES, cached_thumbnail,
+                          generate_thumbnails)
+from .test_thumbnails import make_image
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class CollectGarbageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.live = Post.objects.create(
+            author=self.user, text='Живой', image=make_image())
+        generate_thumbnails(self.live.image)
+        # пост удалён в обход сигналов: файл и миниатюры остались
+        self.dead = Post.objects.create(
+            author=self.user, text='Удалённый',
+            image=make_image('dead.png', (20, 20)))
+        generate_thumbnails(self.dead.image)
+        Post.objects.filter(pk=self.dead.pk).delete()
+        self.stray = default.storage.save('cache/zz/zz/stray.jpg',
+                                          ContentFile(b'jpg'))
+        self.storage = self.live.image.storage
+
+    def test_dry_run_deletes_nothing(self):
+        """Пробный запуск только считает находки."""
+        kv_entries = KVStore.objects.count()
+        counts = collect_garbage(dry_run=True, min_age=0)
+        self.assertEqual(counts, {'images': 1, 'sources': 1,
+                                  'thumbnails': 1})
+        self.assertTrue(self.storage.exists(self.dead.image.name))
+        self.assertTrue(default.storage.exists(self.stray))
+        self.assertEqual(KVStore.objects.count(), kv_entries)
+
+    def test_orphans_deleted(self):
+        """Сборщик удаляет только то, что не нужно живым постам."""
+        geometry_string, options = THUMBNAIL_GEOMETRIES[0]
+        dead_thumbnail = cached_thumbnail(self.dead.image, geometry_string,
+                                          **options)
+        out = StringIO()
+        call_command('collect_media_garbage', min_age=0, batch_size=1,
+                     stdout=out)
+        self.assertIn('картинок 1', out.getvalue())
+        self.assertFalse(self.storage.exists(self.dead.image.name))
+        self.assertFalse(default.storage.exists(dead_thumbnail.name))
+        self.assertFalse(default.storage.exists(self.stray))
+        self.assertTrue(self.storage.exists(self.live.image.name))
+        self.assertIsNotNone(cached_thumbnail(self.live.image,
+                                              geometry_string, **options))
+        self.assertEqual(collect_garbage(min_age=0),
+                         {'images': 0, 'sources': 0, 'thumbnails': 0})
+
+    def test_fresh_files_kept(self):
+        """Свежие файлы не считаются мусором."""
+        counts = collect_garbage(dry_run=True)
+        self.assertEqual(counts['images'], 0)
+        self.assertEqual(counts['thumbnails'], 0)
+
+    def test_rereferenced_images_kept(self):
+        """Картинку, на которую сослались во время обхода, не удалить."""
+        def stale_snapshot(names):
+            # пока шёл обход, удалённую картинку загрузили снова
+            self.storage.save('posts/again.png',
+                              make_image('dead.png', (20, 20)))
+            return set()
+
+        with mock.patch('posts.cleanup.live_images', stale_snapshot):
+            counts = collect_garbage(min_age=0)
+        self.assertEqual(counts['images'], 0)
+        self.assertTrue(self.storage.exists(self.dead.image.name))
+        self.assertTrue(self.storage.exists(self.live.image.name))
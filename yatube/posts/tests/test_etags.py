@@ -0,0 +1,105 @@
+from http import HTTPStatus
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..feed_cache import follow_scope, generation_key
+from ..models import Comment, Follow, Group, Post, User
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='leo')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testslug',
+            description='Для тестов',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        cls.post = Post.objects.create(
+            author=cls.user, text='Тест, тест, тест', group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.urls = (
+            reverse('post:index'),
+            reverse('post:group_list', args=[self.group.slug]),
+            reverse('post:profile', args=[self.user.username]),
+            reverse('post:follow_index'),
+            reverse('post:post_detail', args=[self.post.id]),
+        )
+        # страница поста с формой выдаёт CSRF-cookie, от которой зависит ETag
+        self.reader_client.get(self.urls[-1])
+
+    def etags(self):
+        return {url: self.reader_client.get(url)['ETag']
+                for url in self.urls}
+
+    def test_not_modified_without_render(self):
+        """Неизменившаяся страница отдаёт 304 без отрисовки шаблона."""
+        for url, etag in self.etags().items():
+            with self.subTest(url=url):
+                response = self.reader_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code,
+                                 HTTPStatus.NOT_MODIFIED)
+                self.assertEqual(response.templates, [])
+
+    def test_changes_renew_etag(self):
+        """Правка поста и новый комментарий меняют ETag страниц."""
+        before = self.etags()
+        self.post.text = 'Исправленный текст'
+        self.post.save()
+        edited = self.etags()
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertNotEqual(before[url], edited[url])
+        detail_url = self.urls[-1]
+        Comment.objects.create(post=self.post, author=self.reader, text='Ок')
+        response = self.reader_client.get(
+            detail_url, HTTP_IF_NONE_MATCH=edited[detail_url])
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_follow_feed_reads_author_generation(self):
+        """Лента подписок видит записи автора, не трогая ключи читателя."""
+        url = reverse('post:follow_index')
+        key = generation_key(follow_scope(self.reader.pk))
+        etag = self.reader_client.get(url)['ETag']
+        generation = cache.get(key)
+        Comment.objects.create(post=self.post, author=self.reader, text='Ок')
+        self.assertEqual(cache.get(key), generation)
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        Post.objects.create(author=self.user, text='Новый пост')
+        self.assertEqual(cache.get(key), generation)
+        self.assertNotEqual(self.reader_client.get(url)['ETag'],
+                            response['ETag'])
+
+    def test_new_csrf_token_renews_etag(self):
+        """После повторного входа старый ETag не отдаёт страницу со старым
+        CSRF-токеном."""
+        reader = User.objects.get(pk=self.reader.pk)
+        reader.set_password('пароль')
+        reader.save()
+        self.reader_client.force_login(reader)
+        etags = self.etags()
+        self.reader_client.logout()
+        self.reader_client.post(reverse('users:login'), {
+            'username': reader.username, 'password': 'пароль'})
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.reader_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_etag_depends_on_viewer(self):
+        """Разные зрители получают разные ETag."""
+        url = self.urls[0]
+        self.assertNotEqual(Client().get(url)['ETag'],
+                            self.reader_client.get(url)['ETag'])
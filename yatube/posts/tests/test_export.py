@@ -0,0 +1,75 @@
+import csv
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Group, Post, User
+
+
+class PostExportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.second_user = User.objects.create_user(username='leo')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testslug',
+            description='Для тестов',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='Тест, "тест"', group=cls.group)
+        Post.objects.create(author=cls.second_user, text='Без группы')
+        Comment.objects.create(post=cls.post, author=cls.user, text='Ок')
+
+    EXPORT_URL = reverse('post:post_export')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_export_requires_login(self):
+        """Выгрузка доступна только авторизованным."""
+        response = Client().get(self.EXPORT_URL)
+        self.assertEqual(response.status_code, 302)
+
+    def test_ndjson_export(self):
+        """NDJSON-выгрузка потоковая и содержит все поля поста."""
+        response = self.authorized_client.get(self.EXPORT_URL)
+        self.assertTrue(response.streaming)
+        records = [json.loads(line) for line in
+                   b''.join(response.streaming_content).decode().split('\n')
+                   if line]
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]['author'], 'auth')
+        self.assertEqual(records[0]['group'], 'testslug')
+        self.assertEqual(records[0]['comment_count'], 1)
+        self.assertIsNone(records[1]['group'])
+
+    def test_csv_export_with_filters(self):
+        """CSV-выгрузка учитывает фильтры по группе и автору."""
+        response = self.authorized_client.get(
+            self.EXPORT_URL, {'format': 'csv', 'group': 'testslug',
+                              'author': 'auth'})
+        rows = list(csv.reader(
+            b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0][:3], ['id', 'pub_date', 'author'])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][-1], 'Тест, "тест"')
+
+    def test_invalid_filter(self):
+        """Неверный фильтр даёт 400."""
+        response = self.authorized_client.get(
+            self.EXPORT_URL, {'since': 'вчера'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_command(self):
+        """Команда export_posts выгружает посты по автору."""
+        out = StringIO()
+        call_command('export_posts', author='leo', stdout=out)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([record['text'] for record in records],
+                         ['Без группы'])
@@ -0,0 +1,59 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase
+
+from ..feed import rebuild_feed
+from ..models import FeedEntry, Follow, Post, User
+
+
+class FeedEntryTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='leo')
+        cls.old_post = Post.objects.create(author=cls.author, text='Старый')
+
+    def feed_ids(self):
+        return list(self.reader.feed_entries.values_list('post_id',
+                                                         flat=True))
+
+    def test_follow_backfills_feed(self):
+        """Подписка добавляет в ленту уже опубликованные посты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.feed_ids(), [self.old_post.id])
+
+    def test_new_post_fans_out(self):
+        """Новый пост попадает в ленты подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый')
+        self.assertEqual(self.feed_ids(), [post.id, self.old_post.id])
+        self.assertFalse(self.author.feed_entries.exists())
+
+    def test_unfollow_and_delete_prune_feed(self):
+        """Отписка и удаление поста чистят ленту."""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый')
+        post.delete()
+        self.assertEqual(self.feed_ids(), [self.old_post.id])
+        follow.delete()
+        self.assertEqual(self.feed_ids(), [])
+
+    def test_rebuild_feed_command(self):
+        """Команда rebuild_feed восстанавливает ленты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        FeedEntry.objects.all().delete()
+        call_command('rebuild_feed', stdout=StringIO())
+        self.assertEqual(self.feed_ids(), [self.old_post.id])
+
+    def test_failed_rebuild_keeps_feed(self):
+        """Сбой при пересборке не оставляет ленту пустой."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        with mock.patch('posts.feed.backfill_follow',
+                        side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                rebuild_feed()
+        self.assertEqual(self.feed_ids(), [self.old_post.id])
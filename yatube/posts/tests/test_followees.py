@@ -0,0 +1,81 @@
+from array import array
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..followees import (FOLLOWEE_TYPECODE, followee_ids, followees_key,
+                         is_following)
+from ..models import Follow, User
+from .test_storage import run_on_commit
+
+
+@mock.patch('posts.signals.transaction.on_commit', run_on_commit)
+class FolloweeCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='leo')
+        cls.authors = [User.objects.create_user(username=f'author{i}')
+                       for i in range(5)]
+        for author in cls.authors[::2]:
+            Follow.objects.create(user=cls.reader, author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_sorted_ids_and_membership(self):
+        """Подписки читаются одним запросом, а проверяются без запросов."""
+        expected = sorted(author.id for author in self.authors[::2])
+        self.assertEqual(list(followee_ids(self.reader.id)), expected)
+        with CaptureQueriesContext(connection) as queries:
+            membership = [is_following(self.reader.id, author.id)
+                          for author in self.authors]
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(membership, [True, False, True, False, True])
+
+    def test_follow_and_unfollow_update_cache(self):
+        """Подписка и отписка правят закэшированный массив на месте."""
+        followee_ids(self.reader.id)
+        author = self.authors[1]
+        follow = Follow.objects.create(user=self.reader, author=author)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(is_following(self.reader.id, author.id))
+        self.assertEqual(len(queries), 0)
+        follow.delete()
+        self.assertFalse(is_following(self.reader.id, author.id))
+        self.assertEqual(len(followee_ids(self.reader.id)), 3)
+
+    def test_profile_does_not_query_follows(self):
+        """Страница профиля берёт подписку из кэша."""
+        followee_ids(self.reader.id)
+        url = reverse('post:profile', args=[self.authors[0].username])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.reader_client.get(url)
+        self.assertTrue(response.context['following'])
+        for query in queries.captured_queries:
+            self.assertNotIn('"posts_follow"', query['sql'])
+
+    def test_stale_cache_does_not_break_follow(self):
+        """Подписка сверяется с базой, даже если кэш отстал."""
+        author = self.authors[1]
+        url = reverse('post:profile_follow', args=[author.username])
+        key = followees_key(self.reader.id)
+        # кэш уверен, что подписка есть, а в базе её нет
+        stale = array(FOLLOWEE_TYPECODE,
+                      sorted([*followee_ids(self.reader.id), author.id]))
+        cache.set(key, stale.tobytes())
+        self.reader_client.get(url)
+        self.assertTrue(
+            Follow.objects.filter(user=self.reader, author=author).exists())
+        # кэш не знает о подписке, которая в базе уже есть
+        cache.set(key, b'')
+        response = self.reader_client.get(url)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            Follow.objects.filter(user=self.reader, author=author).count(), 1)
@@ -0,0 +1,265 @@
+import hashlib
+from base64 import b64decode
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..images import PLACEHOLDER_SIZE, normalized_image
+from ..models import Post, User
+from ..thumbnails import generate_thumbnails, process_job
+from .test_storage import run_on_commit
+from .test_thumbnails import make_image
+
+EXIF_ORIENTATION = 0x0112
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageMetadataTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def assert_metadata(self, post, image):
+        self.assertEqual((post.image_width, post.image_height), (40, 30))
+        self.assertEqual(post.image_format, 'PNG')
+        self.assertEqual(post.image_size, image.size)
+        image.seek(0)
+        self.assertEqual(post.image_hash,
+                         hashlib.sha256(image.read()).hexdigest())
+
+    def test_form_fills_metadata(self):
+        """Форма поста сохраняет размеры, вес, формат и хеш картинки."""
+        image = make_image()
+        self.authorized_client.post(reverse('post:post_create'),
+                                    {'text': 'С картинкой', 'image': image})
+        post = Post.objects.get(text='С картинкой')
+        self.assert_metadata(post, image)
+
+        self.authorized_client.post(
+            reverse('post:post_edit', kwargs={'post_id': post.id}),
+            {'text': 'Без новой картинки'})
+        post.refresh_from_db()
+        self.assert_metadata(post, image)
+
+    def test_backfill_command(self):
+        """Команда заполняет сведения о картинках старых постов."""
+        image = make_image()
+        post = Post.objects.create(author=self.user, text='Старый',
+                                   image=image)
+        lost = Post.objects.create(author=self.user, text='Потерянный',
+                                   image=make_image('lost.png', (20, 20)))
+        lost.image.storage.delete(lost.image.name)
+        out = StringIO()
+        call_command('backfill_image_metadata', stdout=out)
+        post.refresh_from_db()
+        self.assert_metadata(post, image)
+        self.assertIn('файлов не найдено: 1', out.getvalue())
+
+    def test_feed_does_not_open_images(self):
+        """Лента выводит width/height, не открывая файлы картинок."""
+        post = Post.objects.create(author=self.user, text='С картинкой',
+                                   image=make_image())
+        generate_thumbnails(post.image)
+        with mock.patch.object(FileSystemStorage, 'open') as open_file:
+            response = self.authorized_client.get(reverse('post:index'))
+        open_file.assert_not_called()
+        self.assertContains(response, 'width="960" height="339"')
+
+
+def make_jpeg(size, orientation=None):
+    buffer = BytesIO()
+    image = Image.new('RGB', size, 'blue')
+    options = {}
+    if orientation is not None:
+        exif = Image.Exif()
+        exif[EXIF_ORIENTATION] = orientation
+        options['exif'] = exif.tobytes()
+    image.save(buffer, 'JPEG', **options)
+    return SimpleUploadedFile('photo.jpg', buffer.getvalue(),
+                              content_type='image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@mock.patch('posts.signals.transaction.on_commit', run_on_commit)
+class ImageNormalizationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_too_many_pixels_rejected(self):
+        """Форма отклоняет картинку с лишними пикселями по заголовку."""
+        with mock.patch('posts.images.IMAGE_MAX_PIXELS', 1000):
+            response = self.authorized_client.post(
+                reverse('post:post_create'),
+                {'text': 'Огромная', 'image': make_image(size=(50, 30))})
+        self.assertIn('Картинка слишком большая: 50×30',
+                      response.context['form'].errors['image'][0])
+        self.assertFalse(Post.objects.exists())
+
+    def test_worker_rotates_strips_and_shrinks(self):
+        """Обработчик поворачивает по EXIF, чистит и уменьшает оригинал."""
+        post = Post.objects.create(author=self.user, text='Фото',
+                                   image=make_jpeg((60, 40), orientation=6))
+        old_name = post.image.name
+        job = post.thumbnail_job
+        with mock.patch('posts.images.IMAGE_MAX_SIDE', 30):
+            process_job(job.pk)
+        post.refresh_from_db()
+        self.assertNotEqual(post.image.name, old_name)
+        self.assertFalse(post.image.storage.exists(old_name))
+        with post.image.storage.open(post.image.name) as file_:
+            image = Image.open(file_)
+            self.assertEqual(image.size, (20, 30))
+            self.assertFalse(len(image.getexif()))
+        self.assertEqual((post.image_width, post.image_height), (20, 30))
+        self.assertTrue(post.image.name.endswith(f'{post.image_hash}.jpg'))
+
+    def test_new_upload_during_job_wins(self):
+        """Картинка, загруженная во время задания, не затирается копией."""
+        post = Post.objects.create(author=self.user, text='Фото',
+                                   image=make_jpeg((60, 40), orientation=6))
+        old_name = post.image.name
+        job = post.thumbnail_job
+        copies = []
+
+        def normalize_then_replace(file_):
+            content = normalized_image(file_)
+            copies.append(hashlib.sha256(content.read()).hexdigest())
+            # автор меняет картинку, пока обработчик её перекодирует
+            fresh = Post.objects.get(pk=post.pk)
+            fresh.image = make_image('new.png', (20, 20))
+            fresh.save()
+            return content
+
+        with mock.patch('posts.thumbnails.normalized_image',
+                        normalize_then_replace):
+            process_job(job.pk)
+        post.refresh_from_db()
+        self.assertNotEqual(post.image.name, old_name)
+        self.assertTrue(post.image.name.endswith('.png'))
+        self.assertTrue(post.image.storage.exists(post.image.name))
+        copy, = copies
+        self.assertFalse(post.image.storage.exists(
+            f'posts/{copy[:2]}/{copy[2:4]}/{copy}.jpg'))
+
+    def test_animation_kept(self):
+        """Анимированный GIF не превращается в один кадр."""
+        buffer = BytesIO()
+        frames = [Image.new('RGB', (60, 40), color)
+                  for color in ('red', 'blue')]
+        frames[0].save(buffer, 'GIF', save_all=True,
+                       append_images=frames[1:], comment=b'camera')
+        post = Post.objects.create(
+            author=self.user, text='Анимация',
+            image=SimpleUploadedFile('anim.gif', buffer.getvalue(),
+                                     content_type='image/gif'))
+        name = post.image.name
+        job = post.thumbnail_job
+        with mock.patch('posts.images.IMAGE_MAX_SIDE', 30):
+            process_job(job.pk)
+        post.refresh_from_db()
+        self.assertEqual(post.image.name, name)
+        with post.image.storage.open(name) as file_:
+            self.assertTrue(Image.open(file_).is_animated)
+
+    def test_clean_image_kept(self):
+        """Картинку без метаданных в пределах размеров не перекодируем."""
+        post = Post.objects.create(author=self.user, text='Фото',
+                                   image=make_jpeg((60, 40)))
+        name = post.image.name
+        job = post.thumbnail_job
+        process_job(job.pk)
+        post.refresh_from_db()
+        self.assertEqual(post.image.name, name)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImagePlaceholderTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def prepared_post(self, text):
+        post = Post.objects.create(author=self.user, text=text,
+                                   image=make_image())
+        process_job(post.thumbnail_job.pk)
+        post.refresh_from_db()
+        return post
+
+    def test_worker_fills_placeholder(self):
+        """Фоновое задание сохраняет средний цвет и крошечную копию."""
+        post = self.prepared_post('Красный')
+        self.assertEqual(post.image_color, '#ff0000')
+        prefix = 'data:image/png;base64,'
+        self.assertTrue(post.image_placeholder.startswith(prefix))
+        tiny = Image.open(BytesIO(
+            b64decode(post.image_placeholder[len(prefix):])))
+        self.assertEqual(tiny.size, PLACEHOLDER_SIZE)
+
+    def test_feed_defers_offscreen_images(self):
+        """Лента грузит лениво всё, кроме первой картинки, с заглушкой."""
+        self.prepared_post('Первый')
+        self.prepared_post('Второй')
+        content = self.guest_client.get(
+            reverse('post:index')).content.decode()
+        self.assertEqual(content.count('fetchpriority="high"'), 1)
+        self.assertEqual(content.count('loading="lazy"'), 1)
+        self.assertEqual(content.count('style="background: #ff0000 url('
+                                       'data:image/png;base64,'), 2)
+
+    def test_new_upload_resets_placeholder(self):
+        """Новая картинка не показывает заглушку прежней."""
+        post = self.prepared_post('Красный')
+        client = Client()
+        client.force_login(self.user)
+        client.post(reverse('post:post_edit', kwargs={'post_id': post.id}),
+                    {'text': 'Другой', 'image': make_image('new.png',
+                                                           (20, 20))})
+        post.refresh_from_db()
+        self.assertEqual((post.image_color, post.image_placeholder), ('', ''))
+        self.assertContains(self.guest_client.get(
+            reverse('post:post_detail', kwargs={'post_id': post.id})),
+            'bg-light')
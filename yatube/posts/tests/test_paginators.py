@@ -0,0 +1,231 @@
+import base64
+from timeit import timeit
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ..feed_cache import INDEX_SCOPE, get_feed_count
+from ..models import Comment, Post, User
+from ..paginators import (CachedCountPaginator, CursorPaginator,
+                          decode_cursor, encode_cursor)
+
+
+class CursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {i}') for i in range(25))
+        # одинаковая дата у всех постов проверяет разрешение по id
+        Post.objects.update(pub_date=timezone.now())
+        cls.ids = list(
+            Post.objects.order_by('-pub_date', '-id')
+            .values_list('id', flat=True))
+
+    INDEX_URL = reverse('post:index')
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_cursor_roundtrip(self):
+        """Токен курсора раскодируется в (pub_date, id)."""
+        post = Post.objects.first()
+        self.assertEqual(decode_cursor(encode_cursor(post)),
+                         (post.pub_date, post.id))
+        self.assertIsNone(decode_cursor('мусор'))
+        naive = base64.urlsafe_b64encode(b'2020-01-01T00:00:00|5').decode()
+        self.assertIsNone(decode_cursor(naive))
+        for pk in (0, -1, 2 ** 70):
+            with self.subTest(pk=pk):
+                huge = base64.urlsafe_b64encode(
+                    f'2020-01-01T00:00:00+00:00|{pk}'.encode()).decode()
+                self.assertIsNone(decode_cursor(huge))
+                response = self.guest_client.get(self.INDEX_URL,
+                                                 {'after': huge})
+                self.assertEqual(response.status_code, 200)
+
+    def test_walk_forward_and_back(self):
+        """Страницы по after/before не теряют и не повторяют посты."""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        first = paginator.get_page()
+        self.assertEqual([p.id for p in first], self.ids[:10])
+        self.assertFalse(first.has_previous())
+        self.assertTrue(first.has_next())
+
+        second = CursorPaginator(Post.objects.all(), 10).get_page(
+            after=first.next_cursor)
+        self.assertEqual([p.id for p in second], self.ids[10:20])
+        third = CursorPaginator(Post.objects.all(), 10).get_page(
+            after=second.next_cursor)
+        self.assertEqual([p.id for p in third], self.ids[20:])
+        self.assertFalse(third.has_next())
+        self.assertTrue(third.has_previous())
+
+        back = CursorPaginator(Post.objects.all(), 10).get_page(
+            before=third.previous_cursor)
+        self.assertEqual([p.id for p in back], self.ids[10:20])
+        first_again = CursorPaginator(Post.objects.all(), 10).get_page(
+            before=back.previous_cursor)
+        self.assertEqual([p.id for p in first_again], self.ids[:10])
+        self.assertFalse(first_again.has_previous())
+
+    def test_no_count_query(self):
+        """Курсорная страница не выполняет COUNT(*)."""
+        response = self.guest_client.get(self.INDEX_URL)
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(
+                self.INDEX_URL
+                + f'?after={response.context["page_obj"].next_cursor}')
+        for query in queries.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'].upper())
+
+    def test_invalid_cursor_shows_first_page(self):
+        """Испорченный курсор отдаёт первую страницу."""
+        response = self.guest_client.get(self.INDEX_URL + '?after=xyz')
+        self.assertEqual(
+            [p.id for p in response.context['page_obj']], self.ids[:10])
+
+
+class CachedCountPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        for i in range(25):
+            Post.objects.create(author=cls.user, text=f'Пост {i}')
+
+    INDEX_URL = reverse('post:index')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(url)
+        return sum('COUNT(' in query['sql'].upper()
+                   for query in queries.captured_queries)
+
+    def test_count_cached_and_shifted(self):
+        """Размер ленты считается один раз и сдвигается сигналами."""
+        self.assertEqual(self.count_queries(self.INDEX_URL + '?page=2'), 1)
+        self.assertEqual(self.count_queries(self.INDEX_URL + '?page=3'), 0)
+        post = Post.objects.create(author=self.user, text='Новый')
+        self.assertEqual(get_feed_count(INDEX_SCOPE), 26)
+        post.delete()
+        self.assertEqual(get_feed_count(INDEX_SCOPE), 25)
+
+    def test_estimated_count(self):
+        """В режиме оценки длинная лента считается до предела."""
+        paginator = CachedCountPaginator(
+            Post.objects.order_by('-pub_date', '-id'), 10, INDEX_SCOPE,
+            estimate=True)
+        with mock.patch('posts.paginators.FEED_COUNT_ESTIMATE_LIMIT', 20):
+            self.assertEqual(paginator.count, 20)
+        self.assertTrue(paginator.estimated)
+        self.assertIsNone(get_feed_count(INDEX_SCOPE))
+
+    @mock.patch('posts.paginators.FEED_COUNT_ESTIMATE_LIMIT', 12)
+    def test_estimated_feed_walks_past_limit(self):
+        """Страницы за оценённым концом ленты доступны по ссылке «дальше»."""
+        seen, number = [], 1
+        while True:
+            page = CachedCountPaginator(
+                Post.objects.order_by('-pub_date', '-id'), 10, INDEX_SCOPE,
+                estimate=True).get_page(number)
+            self.assertEqual(page.number, number)
+            seen += [post.id for post in page]
+            if not page.has_next():
+                break
+            number = page.next_page_number()
+        self.assertEqual(seen, list(Post.objects.order_by(
+            '-pub_date', '-id').values_list('id', flat=True)))
+        self.assertEqual(number, 3)
+
+    def test_elided_page_range(self):
+        """Номера страниц свёрнуты вокруг текущей и по краям."""
+        paginator = CachedCountPaginator(range(500), 10, 'bench')
+        ellipsis = paginator.ELLIPSIS
+        self.assertEqual(
+            paginator.get_page(25).elided_page_range,
+            [1, 2, ellipsis, 22, 23, 24, 25, 26, 27, 28, ellipsis, 49, 50])
+        self.assertEqual(paginator.get_page(1).elided_page_range,
+                         [1, 2, 3, 4, ellipsis, 49, 50])
+
+    def test_paginator_render_does_not_grow(self):
+        """Бенчмарк: отрисовка пагинатора не растёт с длиной ленты."""
+        def render(total):
+            page = CachedCountPaginator(
+                range(total), 10, f'bench:{total}').get_page(50)
+            html = render_to_string('posts/includes/paginator.html',
+                                    {'page_obj': page})
+            seconds = timeit(lambda: render_to_string(
+                'posts/includes/paginator.html', {'page_obj': page}),
+                number=20)
+            return html.count('<li'), seconds
+
+        small_links, small_time = render(1000)
+        huge_links, huge_time = render(500000)
+        self.assertEqual(small_links, huge_links)
+        self.assertLess(huge_time, small_time * 5 + 0.05)
+
+
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        readers = [User.objects.create_user(username=f'reader{i}')
+                   for i in range(5)]
+        for i in range(7):
+            Comment.objects.create(post=cls.post, author=readers[i % 5],
+                                   text=f'Ответ {i}')
+        Comment.objects.update(pub_date=timezone.now())
+        cls.ids = list(Comment.objects.order_by('pub_date', 'id')
+                       .values_list('id', flat=True))
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def ids_of(self, response):
+        return [comment.id for comment in response.context['comments']]
+
+    @mock.patch('posts.paginators.COMMENTS_ON_THE_PAGE', 3)
+    def test_load_more_walks_all_comments(self):
+        """Порции «Показать ещё» проходят все комментарии без повторов."""
+        url = reverse('post:post_detail', args=[self.post.id])
+        for order, ids in (('old', self.ids), ('new', self.ids[::-1])):
+            with self.subTest(order=order):
+                response = self.guest_client.get(url, {'order': order})
+                seen = self.ids_of(response)
+                while response.context['comments'].next_cursor:
+                    response = self.guest_client.get(
+                        reverse('post:post_comments', args=[self.post.id]),
+                        {'order': order,
+                         'after': response.context['comments'].next_cursor})
+                    self.assertTemplateNotUsed(response,
+                                               'posts/post_detail.html')
+                    seen += self.ids_of(response)
+                self.assertEqual(seen, ids)
+
+    @mock.patch('posts.paginators.COMMENTS_ON_THE_PAGE', 3)
+    def test_comment_queries_do_not_grow(self):
+        """Авторы комментариев выбираются тем же запросом."""
+        url = reverse('post:post_comments', args=[self.post.id])
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(url)
+        for _ in range(50):
+            Comment.objects.create(post=self.post, author=self.user,
+                                   text='Ещё')
+        cache.clear()
+        with CaptureQueriesContext(connection) as more_queries:
+            self.guest_client.get(url)
+        self.assertEqual(len(queries), len(more_queries))
@@ -0,0 +1,191 @@
+import hashlib
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, UploadSession, User
+from ..uploads import start_upload
+from .utils import QueryBudgetMixin
+
+TEMP_UPLOAD_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+CHUNK = b'0123456789'
+
+
+@mock.patch('posts.uploads.UPLOAD_SESSION_ROOT', TEMP_UPLOAD_ROOT)
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    """Число запросов страниц не зависит от количества постов."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_UPLOAD_ROOT, ignore_errors=True)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='leo')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testslug',
+            description='Для тестов',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        cls.post = Post.objects.create(
+            author=cls.user, text='Первый пост', group=cls.group)
+        cls.comment = Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Первый комментарий')
+        Comment.objects.create(post=cls.post, author=cls.user,
+                               parent=cls.comment, text='Первый ответ')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.user)
+
+    def grow(self):
+        for i in range(15):
+            Post.objects.create(
+                author=self.user, text=f'Пост {i}', group=self.group)
+            Comment.objects.create(
+                post=self.post, author=self.reader, text=f'Комментарий {i}')
+            Comment.objects.create(
+                post=self.post, author=self.user, parent=self.comment,
+                text=f'Ответ {i}')
+        cache.clear()
+
+    def budgets(self):
+        post_id = self.post.id
+        username = self.user.username
+        upload = start_upload(UploadSession(
+            user=self.reader, filename='photo.jpg', size=len(CHUNK)))
+        upload_url = reverse('post:upload_chunk', args=[upload.id])
+        return (
+            (1, self.guest_client, reverse('post:index')),
+            (3, self.reader_client, reverse('post:index')),
+            (3, self.guest_client,
+             reverse('post:group_list', args=[self.group.slug])),
+            (3, self.guest_client, reverse('post:profile', args=[username])),
+            (6, self.reader_client,
+             reverse('post:profile', args=[username])),
+            (4, self.reader_client, reverse('post:follow_index')),
+            (4, self.guest_client,
+             reverse('post:post_detail', args=[post_id])),
+            (5, self.author_client, reverse('post:post_edit', args=[post_id])),
+            (3, self.author_client, reverse('post:post_create')),
+            (6, self.reader_client,
+             reverse('post:add_comment', args=[post_id]), {'text': 'Ок'}),
+            (8, self.reader_client,
+             reverse('post:profile_unfollow', args=[username])),
+            (10, self.reader_client,
+             reverse('post:profile_follow', args=[username])),
+            (4, self.guest_client,
+             reverse('post:post_comments', args=[post_id])),
+            (3, self.guest_client, reverse(
+                'post:comment_replies', args=[post_id, self.comment.id])),
+            (3, self.reader_client, reverse('post:post_export')),
+            (4, self.reader_client, reverse('post:upload_create'),
+             {'filename': 'photo.jpg', 'size': len(CHUNK)}),
+            (3, self.reader_client, upload_url),
+            (6, self.reader_client, upload_url, CHUNK, 'put', {
+                'HTTP_UPLOAD_OFFSET': '0',
+                'HTTP_X_CHUNK_SHA256': hashlib.sha256(CHUNK).hexdigest()}),
+        )
+
+    def test_query_budget(self):
+        """Бюджет запросов каждой страницы постоянен."""
+        for _ in range(2):
+            for budget, client, url, *data in self.budgets():
+                with self.subTest(url=url):
+                    self.assertQueryBudget(budget, client, url, *data)
+            self.grow()
+
+
+class CommentCountTest(TestCase):
+    """Число комментариев в лентах берётся из счётчика поста."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='leo')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testslug',
+            description='Для тестов',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        cls.post = Post.objects.create(
+            author=cls.user, text='Первый пост', group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def urls(self):
+        return (
+            reverse('post:index'),
+            reverse('post:group_list', args=[self.group.slug]),
+            reverse('post:profile', args=[self.user.username]),
+            reverse('post:follow_index'),
+        )
+
+    def comment(self, post):
+        Comment.objects.create(post=post, author=self.reader, text='Ок')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.reader_client.get(url)
+        return len(queries)
+
+    def test_counts_without_extra_queries(self):
+        """Запросов на странице не больше, сколько бы постов на ней ни было."""
+        self.comment(self.post)
+        cache.clear()
+        budgets = [self.count_queries(url) for url in self.urls()]
+        for i in range(12):
+            post = Post.objects.create(
+                author=self.user, text=f'Пост {i}', group=self.group)
+            for _ in range(i % 3):
+                self.comment(post)
+        cache.clear()
+        for url, budget in zip(self.urls(), budgets):
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), budget)
+                self.assertContains(
+                    self.reader_client.get(url), 'Комментариев: 2')
+
+    def test_post_delete_ignores_comment_count(self):
+        """Удаление поста не тратит запросы на каждый его комментарий."""
+        budgets = []
+        for total in (5, 30):
+            post = Post.objects.create(
+                author=self.user, text='Обсуждаемый', group=self.group)
+            for _ in range(total):
+                self.comment(post)
+            with CaptureQueriesContext(connection) as queries:
+                post.delete()
+            budgets.append(len(queries))
+        self.assertEqual(budgets[0], budgets[1])
+
+    def test_new_comment_refreshes_cached_feeds(self):
+        """Новый комментарий обновляет число в закэшированных лентах."""
+        for url in self.urls():
+            self.assertContains(self.reader_client.get(url),
+                                'Комментариев: 0')
+        self.comment(self.post)
+        for url in self.urls():
+            with self.subTest(url=url):
+                self.assertContains(self.reader_client.get(url),
+                                    'Комментариев: 1')
@@ -0,0 +1,80 @@
+import re
+
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+# полный проход по таблице без индекса или сортировка во временном B-дереве
+BAD_PLAN = re.compile(r'^SCAN (TABLE )?\w+$|TEMP B-TREE')
+# результат подзапроса, который SQLite строит на лету, а не таблица
+SUBQUERY = re.compile(r'^CO-ROUTINE (\S+)$')
+
+
+class QueryPlanTest(TestCase):
+    """Запросы страниц постов идут по индексам и без сортировки."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='leo')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testslug',
+            description='Для тестов',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        for _ in range(15):
+            cls.post = Post.objects.create(
+                author=cls.user,
+                text='Тест, тест, тест',
+                group=cls.group,
+            )
+        Comment.objects.create(post=cls.post, author=cls.reader, text='Ок')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assert_indexed(self, client, url):
+        with CaptureQueriesContext(connection) as queries:
+            client.get(url)
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            steps = self.plan(sql)
+            subqueries = {match[1] for match in map(SUBQUERY.match, steps)
+                          if match}
+            for step in steps:
+                if step.split(' ', 1)[-1] in subqueries:
+                    continue
+                self.assertIsNone(BAD_PLAN.search(step),
+                                  f'{url}: {step}\n{sql}')
+
+    def test_views_use_indexes(self):
+        """EXPLAIN QUERY PLAN не содержит полных проходов и сортировок."""
+        urls = (
+            reverse('post:index'),
+            reverse('post:group_list', kwargs={'SlugField': 'testslug'}),
+            reverse('post:profile', kwargs={'username': 'auth'}),
+            reverse('post:follow_index'),
+            reverse('post:post_detail', kwargs={'post_id': self.post.id}),
+            reverse('post:post_comments', kwargs={'post_id': self.post.id})
+            + '?order=new',
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assert_indexed(self.client, url)
+                page_obj = self.client.get(url).context.get('page_obj')
+                if page_obj is not None and page_obj.next_cursor:
+                    self.assert_indexed(
+                        self.client, f'{url}?after={page_obj.next_cursor}')
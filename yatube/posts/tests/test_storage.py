@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Post, ThumbnailJob, User
+from ..storage import is_hashed
+from ..thumbnails import release_image
+from .test_thumbnails import make_image
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def run_on_commit(func):
+    func()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@mock.patch('posts.signals.transaction.on_commit', run_on_commit)
+class ContentAddressedStorageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def create(self, image):
+        return Post.objects.create(author=self.user, text='Пост',
+                                   image=image)
+
+    def test_identical_uploads_share_file(self):
+        """Одинаковые картинки хранятся одним файлом в шардах по хешу."""
+        first = self.create(make_image('one.png'))
+        second = self.create(make_image('two.png'))
+        other = self.create(make_image('three.png', (20, 20)))
+        self.assertTrue(is_hashed(first.image.name))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, other.image.name)
+        digest = first.image.name.rsplit('/', 1)[1].split('.')[0]
+        self.assertTrue(first.image.name.startswith(
+            f'posts/{digest[:2]}/{digest[2:4]}/'))
+
+    def test_file_deleted_with_last_reference(self):
+        """Файл удаляется, когда его не использует ни один пост."""
+        first = self.create(make_image())
+        second = self.create(make_image())
+        name = first.image.name
+        first.delete()
+        self.assertTrue(first.image.storage.exists(name))
+        second.delete()
+        self.assertFalse(first.image.storage.exists(name))
+
+    def test_reupload_keeps_released_file(self):
+        """Повторная загрузка освежает файл, и его не удалить из-под неё."""
+        post = self.create(make_image())
+        name = post.image.name
+        path = post.image.storage.path(name)
+        os.utime(path, (0, 0))
+        Post.objects.filter(pk=post.pk).delete()
+        released = time.time()
+        # тот же файл загружен снова, а пост с ним ещё не сохранён
+        post.image.storage.save('posts/again.png', make_image())
+        self.assertGreaterEqual(os.path.getmtime(path), released)
+        self.assertFalse(release_image(name, since=released))
+        self.assertTrue(post.image.storage.exists(name))
+
+    def test_replaced_image_released(self):
+        """Заменённая при редактировании картинка удаляется."""
+        post = self.create(make_image())
+        old_name = post.image.name
+        self.authorized_client.post(
+            reverse('post:post_edit', kwargs={'post_id': post.id}),
+            {'text': 'Новая картинка',
+             'image': make_image('new.png', (20, 20))})
+        post.refresh_from_db()
+        self.assertNotEqual(post.image.name, old_name)
+        self.assertFalse(post.image.storage.exists(old_name))
+        self.assertTrue(post.image.storage.exists(post.image.name))
+
+    def test_migrate_media_storage(self):
+        """Команда переносит старые файлы в хешированное хранилище."""
+        image = make_image()
+        legacy = default_storage.save('posts/legacy.png',
+                                      ContentFile(image.read()))
+        post = self.create(None)
+        Post.objects.filter(pk=post.pk).update(image=legacy)
+        call_command('migrate_media_storage', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertTrue(is_hashed(post.image.name))
+        self.assertTrue(post.image.name.endswith(f'{post.image_hash}.png'))
+        self.assertTrue(post.image.storage.exists(post.image.name))
+        self.assertFalse(default_storage.exists(legacy))
+        self.assertTrue(ThumbnailJob.objects.filter(post=post).exists())
@@ -0,0 +1,130 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from yatube.settings import COMMENT_REPLIES_ON_THE_PAGE
+
+from ..models import Comment, Post, User
+from ..threads import attach_replies, next_replies
+
+
+class CommentThreadTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def comment(self, text, parent=None):
+        return Comment.objects.create(post=self.post, author=self.user,
+                                      text=text, parent=parent)
+
+    def reply(self, text, parent=None):
+        return self.authorized_client.post(
+            reverse('post:add_comment', args=[self.post.id]),
+            {'text': text, 'parent': parent.id if parent else ''})
+
+    def test_thread_in_depth_first_order(self):
+        """Ответы раскладываются по корням в порядке обхода в глубину."""
+        first = self.comment('1')
+        second = self.comment('2')
+        first_reply = self.comment('1.1', first)
+        self.comment('2.1', second)
+        self.comment('1.1.1', first_reply)
+        self.comment('1.2', first)
+        roots = list(Comment.objects.filter(parent=None).order_by('path'))
+        with CaptureQueriesContext(connection) as queries:
+            attach_replies(roots)
+            thread = [[(c.text, c.depth, c.author.username)
+                       for c in root.thread_replies] for root in roots]
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(
+            [[(text, depth) for text, depth, _ in replies]
+             for replies in thread],
+            [[('1.1', 1), ('1.1.1', 2), ('1.2', 1)], [('2.1', 1)]])
+        self.assertEqual([root.more_replies for root in roots],
+                         [False, False])
+
+    def test_replies_capped_with_more_link(self):
+        """Под корнем видны первые ответы, остальные подгружаются."""
+        root = self.comment('Корень')
+        other = self.comment('Другой')
+        self.comment('Ответ другому', other)
+        for i in range(5):
+            self.comment(f'Ответ {i}', root)
+        roots = [root, other]
+        attach_replies(roots, limit=2)
+        self.assertEqual([c.text for c in root.thread_replies],
+                         ['Ответ 0', 'Ответ 1'])
+        self.assertEqual([r.more_replies for r in roots], [True, False])
+        replies, more = next_replies(root, root.thread_replies[-1].path,
+                                     limit=2)
+        self.assertEqual([c.text for c in replies], ['Ответ 2', 'Ответ 3'])
+        self.assertTrue(more)
+        replies, more = next_replies(root, replies[-1].path, limit=2)
+        self.assertEqual([c.text for c in replies], ['Ответ 4'])
+        self.assertFalse(more)
+        # чужой путь не выводит за пределы ветки
+        replies, _ = next_replies(root, other.path)
+        self.assertEqual(len(replies), 5)
+
+    def test_more_replies_link(self):
+        """Ссылка «Показать ещё ответы» отдаёт следующую порцию."""
+        root = self.comment('Корень')
+        for i in range(COMMENT_REPLIES_ON_THE_PAGE + 1):
+            self.comment(f'Ответ №{i}.', root)
+        last = f'Ответ №{COMMENT_REPLIES_ON_THE_PAGE}.'
+        response = self.authorized_client.get(
+            reverse('post:post_detail', args=[self.post.id]))
+        self.assertNotContains(response, last)
+        url = reverse('post:comment_replies', args=[self.post.id, root.id])
+        self.assertContains(response, url)
+        after = response.context['comments'][0].thread_replies[-1].path
+        response = self.authorized_client.get(url, {'after': after})
+        self.assertContains(response, last)
+        self.assertNotContains(response, 'Ответ №0.')
+        self.assertNotContains(response, 'Показать ещё ответы')
+
+    def test_reply_through_form(self):
+        """Ответ сохраняется под родителем из того же поста."""
+        root = self.comment('Корень')
+        self.reply('Ответ', root)
+        reply = Comment.objects.get(text='Ответ')
+        self.assertEqual(reply.parent, root)
+        self.assertEqual(reply.path[:len(root.path)], root.path)
+        other = Post.objects.create(author=self.user, text='Другой')
+        stranger = Comment.objects.create(post=other, author=self.user,
+                                          text='Чужой')
+        self.reply('Мимо', stranger)
+        self.assertFalse(Comment.objects.filter(text='Мимо').exists())
+
+    @mock.patch('posts.forms.COMMENT_MAX_DEPTH', 1)
+    def test_depth_limited(self):
+        """Ответ глубже предела становится соседом родителя."""
+        root = self.comment('Корень')
+        child = self.comment('Ответ', root)
+        self.reply('Ещё глубже', child)
+        self.assertEqual(Comment.objects.get(text='Ещё глубже').parent,
+                         root)
+
+    def test_detail_renders_thread_without_extra_queries(self):
+        """Страница поста не делает запросов на каждый ответ."""
+        url = reverse('post:post_detail', args=[self.post.id])
+        root = self.comment('Корень')
+        self.comment('Ответ', root)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(url)
+        self.assertContains(response, 'Ответ')
+        parent = root
+        for i in range(5):
+            parent = self.comment(f'Ответ {i}', parent)
+        with CaptureQueriesContext(connection) as more_queries:
+            self.authorized_client.get(url)
+        self.assertEqual(len(queries), len(more_queries))
@@ -0,0 +1,305 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image, features
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.models import KVStore
+
+from yatube.settings import IMAGE_VARIANT_WIDTHS
+
+from ..models import Post, ThumbnailJob, User
+from ..thumbnails import (IMAGE_SIZES, IMAGE_VARIANTS, THUMBNAIL_GEOMETRIES,
+                          cached_thumbnail, generate_thumbnails,
+                          image_sources, prefetch_thumbnails,
+                          wait_for_thumbnails)
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_image(name='pic.png', size=(40, 30)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(),
+                              content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailJobTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_create_enqueues_and_renders_placeholder(self):
+        """Новый пост ставит задание, а лента показывает заглушку."""
+        with mock.patch('posts.thumbnails.get_thumbnail') as generate:
+            self.authorized_client.post(
+                reverse('post:post_create'),
+                {'text': 'С картинкой', 'image': make_image()})
+            response = self.authorized_client.get(reverse('post:index'))
+        generate.assert_not_called()
+        post = Post.objects.get(text='С картинкой')
+        self.assertTrue(ThumbnailJob.objects.filter(post=post).exists())
+        self.assertContains(response, 'bg-light')
+        self.assertNotContains(response, '<img class="card-img')
+
+    def test_worker_generates_all_geometries(self):
+        """Обработка очереди создаёт миниатюры и снимает задания."""
+        post = Post.objects.create(
+            author=self.user, text='С картинкой', image=make_image())
+        pages = []
+
+        def render_then_generate(image):
+            # страница, собранная посреди задания, кеширует заглушку
+            pages.append(self.authorized_client.get(reverse('post:index')))
+            generate_thumbnails(image)
+
+        with mock.patch('posts.thumbnails.generate_thumbnails',
+                        render_then_generate):
+            call_command('process_thumbnails', stdout=StringIO())
+        before, = pages
+        self.assertNotContains(before, '<img class="card-img')
+        self.assertFalse(ThumbnailJob.objects.exists())
+        for geometry_string, options in THUMBNAIL_GEOMETRIES:
+            with self.subTest(geometry=geometry_string):
+                self.assertIsNotNone(
+                    cached_thumbnail(post.image, geometry_string, **options))
+        response = self.authorized_client.get(reverse('post:index'))
+        self.assertContains(response, '<img class="card-img')
+        response = self.authorized_client.get(
+            reverse('post:index'), HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_ready_thumbnails_replace_cached_misses(self):
+        """Миниатюры из другого процесса видны после сброса промахов."""
+        post = Post.objects.create(
+            author=self.user, text='С картинкой', image=make_image())
+        self.assertEqual(image_sources(post.image), [])
+        # миниатюры пишутся в БД, а закешированные промахи остаются,
+        # как если бы задание выполнял другой процесс
+        with mock.patch.object(default.kvstore.cache, 'set'):
+            call_command('process_thumbnails', stdout=StringIO())
+        self.assertNotEqual(image_sources(post.image), [])
+
+    def test_image_replaced_during_job_keeps_job(self):
+        """Замена картинки во время задания оставляет задание для новой."""
+        post = Post.objects.create(
+            author=self.user, text='С картинкой', image=make_image())
+
+        def replace_then_generate(image):
+            generate_thumbnails(image)
+            fresh = Post.objects.get(pk=post.pk)
+            fresh.image = make_image('new.png', (20, 20))
+            fresh.save()
+
+        with mock.patch('posts.thumbnails.generate_thumbnails',
+                        replace_then_generate):
+            call_command('process_thumbnails', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.thumbnail_job.image, post.image.name)
+        call_command('process_thumbnails', stdout=StringIO())
+        self.assertFalse(ThumbnailJob.objects.exists())
+        for geometry_string, options in THUMBNAIL_GEOMETRIES:
+            with self.subTest(geometry=geometry_string):
+                self.assertIsNotNone(
+                    cached_thumbnail(post.image, geometry_string, **options))
+
+    def test_any_save_enqueues_job(self):
+        """Картинка, сохранённая в обход формы, тоже получает миниатюры."""
+        post = Post.objects.create(author=self.user, text='Без картинки')
+        self.assertFalse(ThumbnailJob.objects.exists())
+        post.image = make_image()
+        post.save()
+        self.assertEqual(post.thumbnail_job.image, post.image.name)
+        call_command('process_thumbnails', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (40, 30))
+        self.assertEqual(post.image_format, 'PNG')
+        self.assertTrue(post.image_placeholder)
+
+    def test_broken_images_do_not_stop_queue(self):
+        """Пропавший или битый файл не мешает остальным заданиям."""
+        missing = Post.objects.create(
+            author=self.user, text='Пропавшая',
+            image=make_image('gone.png', size=(20, 20)))
+        missing.image.storage.delete(missing.image.name)
+        Post.objects.create(
+            author=self.user, text='Битая', image=SimpleUploadedFile(
+                'broken.png', b'not an image', content_type='image/png'))
+        post = Post.objects.create(
+            author=self.user, text='С картинкой', image=make_image())
+        with self.assertLogs('posts.thumbnails', 'ERROR') as logs:
+            call_command('process_thumbnails', stdout=StringIO())
+        self.assertEqual(len(logs.records), 2)
+        self.assertFalse(ThumbnailJob.objects.exists())
+        for geometry_string, options in THUMBNAIL_GEOMETRIES:
+            with self.subTest(geometry=geometry_string):
+                self.assertIsNotNone(
+                    cached_thumbnail(post.image, geometry_string, **options))
+
+    def test_picture_markup_lists_variants(self):
+        """Карточка поста отдаёт <picture> со srcset всех ширин."""
+        post = Post.objects.create(
+            author=self.user, text='С картинкой', image=make_image())
+        generate_thumbnails(post.image)
+        content = self.authorized_client.get(
+            reverse('post:index')).content.decode()
+        self.assertIn('<picture>', content)
+        self.assertIn(f'sizes="{IMAGE_SIZES}"', content)
+        for width in IMAGE_VARIANT_WIDTHS:
+            with self.subTest(width=width):
+                self.assertIn(f' {width}w', content)
+
+    @skipUnless(features.check('webp'), 'Pillow собран без WebP')
+    def test_webp_source_first(self):
+        """WebP предлагается раньше запасного JPEG."""
+        post = Post.objects.create(
+            author=self.user, text='С картинкой', image=make_image())
+        generate_thumbnails(post.image)
+        sources = image_sources(post.image)
+        self.assertEqual([source['type'] for source in sources],
+                         ['image/webp', 'image/jpeg'])
+        self.assertTrue(sources[0]['largest'].name.endswith('.webp'))
+
+    def test_build_image_variants_command(self):
+        """Команда достраивает варианты для уже загруженных картинок."""
+        post = Post.objects.create(
+            author=self.user, text='С картинкой', image=make_image())
+        self.assertEqual(image_sources(post.image), [])
+        call_command('build_image_variants', processes=1, stdout=StringIO())
+        for _, _, geometry_string, options in IMAGE_VARIANTS:
+            with self.subTest(geometry=geometry_string,
+                              format=options['format']):
+                self.assertIsNotNone(
+                    cached_thumbnail(post.image, geometry_string, **options))
+
+
+BACKGROUND_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=BACKGROUND_MEDIA_ROOT, THUMBNAIL_WORKERS=1)
+@mock.patch('posts.thumbnails.background_workers', return_value=1)
+class BackgroundThumbnailTest(TransactionTestCase):
+    """Задание после коммита выполняется фоновым потоком.
+
+    С тестовой базой в памяти потоки выключены; здесь они безопасны,
+    потому что тест дожидается их до следующего запроса к базе.
+    """
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        # TransactionTestCase идёт после остальных классов модуля, которые
+        # уже удалили свой каталог, поэтому у этого класса каталог свой
+        shutil.rmtree(BACKGROUND_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # БД между тестами откатывается, а кеш хранилища ключей — нет
+        cache.clear()
+
+    def tearDown(self):
+        wait_for_thumbnails()
+        super().tearDown()
+
+    def test_background_worker_builds_thumbnails(self, background_workers):
+        """Фоновый поток готовит картинку и снимает задание с очереди."""
+        user = User.objects.create_user(username='auth')
+        client = Client()
+        client.force_login(user)
+        client.post(reverse('post:post_create'),
+                    {'text': 'С картинкой', 'image': make_image()})
+        wait_for_thumbnails()
+        post = Post.objects.get()
+        self.assertFalse(ThumbnailJob.objects.exists())
+        self.assertTrue(post.image_placeholder)
+        for geometry_string, options in THUMBNAIL_GEOMETRIES:
+            with self.subTest(geometry=geometry_string):
+                self.assertIsNotNone(
+                    cached_thumbnail(post.image, geometry_string, **options))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPrefetchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def add_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(
+                author=self.user, text=f'Пост {i}',
+                image=make_image(f'pic{i}.png'))
+            generate_thumbnails(post.image)
+
+    def lookups(self):
+        """Обращения к хранилищу миниатюр при отрисовке ленты."""
+        kvstore = default.kvstore
+        cache.clear()
+        with mock.patch.object(kvstore, '_get_raw',
+                               wraps=kvstore._get_raw) as get, \
+                mock.patch.object(kvstore.cache, 'get_many',
+                                  wraps=kvstore.cache.get_many) as get_many, \
+                CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(reverse('post:index'))
+        prefix = thumbnail_settings.THUMBNAIL_KEY_PREFIX
+        batched = sum(str(call.args[0][0]).startswith(prefix)
+                      for call in get_many.call_args_list if call.args[0])
+        kv_queries = sum(KVStore._meta.db_table in query['sql']
+                         for query in queries.captured_queries)
+        return response, get.call_count, batched, kv_queries
+
+    def test_page_thumbnails_fetched_in_one_batch(self):
+        """Миниатюры страницы читаются одним get_many и одним запросом."""
+        for total in (2, 6):
+            with self.subTest(posts=total):
+                self.add_posts(total - Post.objects.count())
+                response, single, batched, kv_queries = self.lookups()
+                self.assertEqual(
+                    response.content.decode().count('<img class="card-img'),
+                    total)
+                self.assertEqual(single, 0)
+                self.assertEqual(batched, 1)
+                self.assertEqual(kv_queries, 1)
+
+    def test_missing_thumbnails_remembered(self):
+        """Отсутствующая миниатюра кешируется и не ищется в БД снова."""
+        post = Post.objects.create(
+            author=self.user, text='Без миниатюры', image=make_image())
+        cache.clear()
+        prefetch_thumbnails([post])
+        self.assertEqual(list(post.prefetched_thumbnails.values()),
+                         [None] * len(THUMBNAIL_GEOMETRIES))
+        with CaptureQueriesContext(connection) as queries:
+            prefetch_thumbnails([Post.objects.get(pk=post.pk)])
+        self.assertEqual(len(queries.captured_queries), 1)
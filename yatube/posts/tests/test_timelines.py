@@ -0,0 +1,128 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import Follow, Post, User
+from ..timelines import author_timelines, merge_timelines, timeline_key
+from .test_storage import run_on_commit
+
+
+class TimelineMergeTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='leo')
+        cls.authors = [User.objects.create_user(username=f'author{i}')
+                       for i in range(4)]
+        stranger = User.objects.create_user(username='stranger')
+        for i in range(27):
+            Post.objects.create(author=cls.authors[i % 4], text=f'Пост {i}')
+        Post.objects.create(author=stranger, text='Чужой')
+        # совпадающие даты проверяют порядок по id при слиянии
+        Post.objects.filter(id__in=Post.objects.order_by('id')
+                            .values_list('id', flat=True)[:6]).update(
+            pub_date=timezone.now())
+        for author in cls.authors:
+            Follow.objects.create(user=cls.reader, author=author)
+        cls.ids = list(
+            Post.objects.filter(author__in=cls.authors)
+            .order_by('-pub_date', '-id').values_list('id', flat=True))
+
+    URL = reverse('post:follow_index')
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def walk(self):
+        response = self.reader_client.get(self.URL)
+        seen = [post.id for post in response.context['page_obj']]
+        while response.context['page_obj'].next_cursor:
+            response = self.reader_client.get(
+                self.URL,
+                {'after': response.context['page_obj'].next_cursor})
+            seen += [post.id for post in response.context['page_obj']]
+        return seen
+
+    def test_merged_pages_match_feed_order(self):
+        """Слияние лент даёт тот же порядок, что и общая выборка."""
+        self.assertEqual(self.walk(), self.ids)
+
+    def test_truncated_timelines_fall_back(self):
+        """Если обрезанных лент не хватает, страница строится по FeedEntry."""
+        with mock.patch('posts.timelines.TIMELINE_LENGTH', 3):
+            self.assertEqual(self.walk(), self.ids)
+            timelines = author_timelines(a.id for a in self.authors)
+            self.assertIsNone(
+                merge_timelines(list(timelines.values()), None, 11))
+
+    def test_warm_page_hydrates_in_one_query(self):
+        """С прогретыми лентами посты выбираются одним запросом по id."""
+        self.reader_client.get(self.URL)
+        with CaptureQueriesContext(connection) as queries:
+            self.reader_client.get(self.URL)
+        post_queries = [query['sql'] for query in queries.captured_queries
+                        if 'FROM "posts_' in query['sql']]
+        self.assertEqual(len(post_queries), 1)
+        self.assertIn('"posts_post"."id" IN', post_queries[0])
+
+    @mock.patch('posts.signals.transaction.on_commit', run_on_commit)
+    def test_new_and_deleted_posts_update_timelines(self):
+        """Новый пост попадает в ленту сразу, удалённый — исчезает."""
+        self.reader_client.get(self.URL)
+        post = Post.objects.create(author=self.authors[1], text='Новый')
+        response = self.reader_client.get(self.URL)
+        self.assertEqual(response.context['page_obj'][0], post)
+        post.delete()
+        response = self.reader_client.get(self.URL)
+        self.assertEqual(response.context['page_obj'][0].id, self.ids[0])
+
+    def test_rolled_back_post_stays_out_of_timeline(self):
+        """Откаченный пост не попадает в закэшированную ленту автора."""
+        self.reader_client.get(self.URL)
+        key = timeline_key(self.authors[1].id)
+        timeline = cache.get(key)
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                Post.objects.create(author=self.authors[1], text='Черновик')
+                raise RuntimeError
+        self.assertEqual(cache.get(key), timeline)
+
+    def test_naive_cursor_shows_first_page(self):
+        """Курсор с датой без часового пояса не роняет страницу."""
+        response = self.reader_client.get(
+            self.URL, {'after': 'MjAyMC0wMS0wMVQwMDowMDowMHw1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['page_obj'][0].id, self.ids[0])
+
+    def test_cold_timelines_loaded_in_one_query(self):
+        """Число запросов холодной ленты не растёт с числом подписок."""
+        reader = User.objects.create_user(username='many')
+        authors = [User.objects.create_user(username=f'writer{i}')
+                   for i in range(60)]
+        Post.objects.bulk_create(
+            Post(author=author, text=f'Пост {author.username}')
+            for author in authors)
+        for author in authors:
+            Follow.objects.create(user=reader, author=author)
+        client = Client()
+        client.force_login(reader)
+        counts = []
+        for viewer in (self.reader_client, client):
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = viewer.get(self.URL)
+            counts.append(len(queries.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+        expected = list(
+            Post.objects.filter(author__in=authors)
+            .order_by('-pub_date', '-id')
+            .values_list('id', flat=True)[:len(response.context['page_obj'])])
+        self.assertEqual([post.id for post in response.context['page_obj']],
+                         expected)
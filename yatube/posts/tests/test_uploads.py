@@ -0,0 +1,163 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import Post, UploadSession, User
+from ..uploads import AssembledUpload, session_path
+from .test_images import make_jpeg
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_UPLOAD_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@mock.patch('posts.uploads.UPLOAD_SESSION_ROOT', TEMP_UPLOAD_ROOT)
+class ChunkedUploadTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.content = make_jpeg((300, 200)).read()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(TEMP_UPLOAD_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def start(self):
+        response = self.authorized_client.post(
+            reverse('post:upload_create'),
+            {'filename': 'photo.jpg', 'size': len(self.content)})
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def put(self, upload_id, offset, chunk, checksum=None):
+        return self.authorized_client.put(
+            reverse('post:upload_chunk', args=[upload_id]), chunk,
+            content_type='application/octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset),
+            HTTP_X_CHUNK_SHA256=checksum or hashlib.sha256(chunk).hexdigest())
+
+    def upload(self):
+        upload_id = self.start()
+        middle = len(self.content) // 2
+        self.put(upload_id, 0, self.content[:middle])
+        self.put(upload_id, middle, self.content[middle:])
+        return upload_id
+
+    def test_chunks_resume_from_offset(self):
+        """Куски дописываются по смещению, которое сообщает сервер."""
+        upload_id = self.start()
+        middle = len(self.content) // 2
+        self.put(upload_id, 0, self.content[:middle])
+        status = self.authorized_client.get(
+            reverse('post:upload_chunk', args=[upload_id])).json()
+        self.assertEqual(status, {'offset': middle,
+                                  'size': len(self.content)})
+        response = self.put(upload_id, middle, self.content[middle:])
+        self.assertEqual(response.json()['offset'], len(self.content))
+        with open(session_path(UploadSession.objects.get()), 'rb') as file_:
+            self.assertEqual(file_.read(), self.content)
+
+    def test_wrong_offset_conflicts(self):
+        """Кусок не с того смещения отклоняется с текущим смещением."""
+        upload_id = self.start()
+        response = self.put(upload_id, 10, self.content[10:20])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 0)
+
+    def test_corrupted_chunk_rejected(self):
+        """Кусок с неверной суммой отрезается и не сдвигает смещение."""
+        upload_id = self.start()
+        response = self.put(upload_id, 0, self.content[:100], '0' * 64)
+        self.assertEqual(response.status_code, 400)
+        upload = UploadSession.objects.get()
+        self.assertEqual(upload.offset, 0)
+        self.assertEqual(os.path.getsize(session_path(upload)), 0)
+
+    def test_oversized_upload_refused(self):
+        """Сессию для слишком большого файла не открыть."""
+        with mock.patch('posts.forms.UPLOAD_MAX_SIZE', 10):
+            response = self.authorized_client.post(
+                reverse('post:upload_create'),
+                {'filename': 'photo.jpg', 'size': 11})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_post_created_from_upload(self):
+        """Собранный файл проходит PostForm и становится картинкой поста."""
+        upload_id = self.upload()
+        path = session_path(UploadSession.objects.get())
+        self.authorized_client.post(
+            reverse('post:post_create'),
+            {'text': 'Пост', 'upload': upload_id})
+        post = Post.objects.get()
+        self.assertEqual((post.image_width, post.image_height), (300, 200))
+        with post.image.open('rb') as file_:
+            self.assertEqual(file_.read(), self.content)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_upload_file_not_left_open(self):
+        """Ни отклонённая форма, ни чужая правка не держат файл открытым."""
+        opened = []
+
+        class RecordedUpload(AssembledUpload):
+            def __init__(self, session):
+                super().__init__(session)
+                opened.append(self)
+
+        upload_id = self.upload()
+        post = Post.objects.create(author=self.user, text='Пост')
+        stranger = User.objects.create_user(username='stranger')
+        stranger_client = Client()
+        stranger_client.force_login(stranger)
+        with mock.patch('posts.forms.AssembledUpload', RecordedUpload):
+            response = self.authorized_client.post(
+                reverse('post:post_create'),
+                {'text': '', 'upload': upload_id})
+            self.assertTrue(response.context['form'].has_error('text'))
+            UploadSession.objects.update(user=stranger)
+            stranger_client.post(
+                reverse('post:post_edit', args=[post.id]),
+                {'text': 'Чужая правка', 'upload': upload_id})
+        self.assertEqual(len(opened), 2)
+        for upload in opened:
+            self.assertTrue(upload.closed)
+
+    def test_incomplete_upload_not_attached(self):
+        """Незавершённую или чужую загрузку к посту не прикрепить."""
+        upload_id = self.start()
+        response = self.authorized_client.post(
+            reverse('post:post_create'),
+            {'text': 'Пост', 'upload': upload_id})
+        self.assertTrue(response.context['form'].has_error('image'))
+        other = Client()
+        other.force_login(User.objects.create_user(username='leo'))
+        response = other.post(reverse('post:post_create'),
+                              {'text': 'Пост', 'upload': self.upload()})
+        self.assertTrue(response.context['form'].has_error('image'))
+        self.assertFalse(Post.objects.exists())
+
+    def test_stale_sessions_purged(self):
+        """Брошенные сессии удаляются вместе с файлами."""
+        self.start()
+        stale = UploadSession.objects.get()
+        UploadSession.objects.update(
+            updated=timezone.now() - timedelta(days=2))
+        self.start()
+        self.assertEqual(UploadSession.objects.count(), 1)
+        self.assertFalse(os.path.exists(session_path(stale)))
@@ -280,14 +280,34 @@ class PostViewsTest(TestCase):
         response = self.second_authorized_client.get(self.INDEX_URL)
         self.assertContains(response, text)
 
-        Post.objects.filter(group=self.new_group).delete()
+        # update() не шлёт сигналов, поэтому фрагмент остаётся в кэше
+        Post.objects.filter(group=self.new_group).update(text='Другой')
         response = self.second_authorized_client.get(self.INDEX_URL)
         self.assertContains(response, text)
 
-        cache.clear()
+        response = self.second_authorized_client.get(
+            self.INDEX_URL + '?page=2')
+        self.assertNotContains(response, text)
+
+        Post.objects.filter(group=self.new_group).delete()
         response = self.second_authorized_client.get(self.INDEX_URL)
         self.assertNotContains(response, text)
 
+    def test_cached_feeds_invalidated(self):
+        """Правка поста сбрасывает кэш лент главной, группы и автора"""
+        cache.clear()
+        for name in (self.INDEX_URL, self.GROUP_LIST_URL,
+                     self.USERNAME_URL):
+            self.authorized_client.get(name)
+        self.authorized_client.post(self.POST_EDIT_URL,
+                                    {'text': 'Исправленный текст',
+                                     'group': self.group.id})
+        for name in (self.INDEX_URL, self.GROUP_LIST_URL,
+                     self.USERNAME_URL):
+            with self.subTest(name=name):
+                response = self.authorized_client.get(name)
+                self.assertContains(response, 'Исправленный текст')
+
     def test_follow_index(self):
         """Тестирование отображения подписок"""
         text = 'Тестирование отображения подписки'
@@ -0,0 +1,24 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """Проверка точного числа SQL-запросов на одно обращение к странице."""
+
+    def assertQueryBudget(self, budget, client, url, data=None, method=None,
+                          extra=None):
+        """Страница url укладывается ровно в budget запросов к БД.
+
+        Без method данные отправляются POST-запросом, без данных — GET;
+        потоковый ответ считается вместе с выдачей всего содержимого.
+        """
+        if method is None:
+            method = 'get' if data is None else 'post'
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, method)(url, data, **(extra or {}))
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(
+            len(queries), budget,
+            f'{url}: {len(queries)} запросов вместо {budget}:\n'
+            + '\n'.join(query['sql'] for query in queries.captured_queries))
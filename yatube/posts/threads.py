@@ -0,0 +1,65 @@
+"""Ветки комментариев на материализованных путях.
+
+Путь комментария — id всех его предков и его самого в сегментах
+фиксированной ширины, поэтому ветка или поддерево выбираются одним
+диапазонным запросом по индексу (post, path) уже в порядке обхода в
+глубину, а отрисовка не делает запросов на каждый узел.
+"""
+from functools import reduce
+from operator import attrgetter, or_
+
+from django.db.models import Q
+
+from yatube.settings import COMMENT_REPLIES_ON_THE_PAGE
+
+from .models import PATH_SEGMENT_LENGTH, Comment
+
+# больше любого символа сегмента: [path, path + PATH_END) — всё поддерево
+PATH_END = '~'
+
+
+def subtree_range(path):
+    return Q(path__gt=path, path__lt=path + PATH_END)
+
+
+def next_replies(root, after=None, limit=COMMENT_REPLIES_ON_THE_PAGE):
+    """Следующие limit ответов ветки root после пути after.
+
+    Возвращает ответы в порядке обхода ветки и признак, что за ними
+    есть ещё.
+    """
+    if not after or not after.startswith(root.path):
+        after = root.path
+    replies = list(Comment.objects.select_related('author')
+                   .filter(post_id=root.post_id, path__gt=after,
+                           path__lt=root.path + PATH_END)
+                   .order_by('path')[:limit + 1])
+    return replies[:limit], len(replies) > limit
+
+
+def attach_replies(roots, limit=COMMENT_REPLIES_ON_THE_PAGE):
+    """Подвешивает к корневым комментариям первые ответы на них.
+
+    Первые limit ответов каждого корня в порядке обхода ветки попадают
+    в thread_replies, а more_replies говорит, что ответов больше. Всё
+    выбирается одним запросом: для каждого корня — подзапрос с LIMIT по
+    диапазону индекса, так что большие ветки не читаются целиком.
+    """
+    by_path = {root.path: root for root in roots}
+    for root in roots:
+        root.thread_replies = []
+        root.more_replies = False
+    if not by_path:
+        return
+    post_id = roots[0].post_id
+    replies = Comment.objects.select_related('author').filter(reduce(or_, (
+        Q(id__in=Comment.objects.filter(subtree_range(path), post_id=post_id)
+          .order_by('path').values('id')[:limit + 1])
+        for path in by_path))).order_by()
+    # сортировка в памяти: строк не больше limit + 1 на корень
+    for reply in sorted(replies, key=attrgetter('path')):
+        root = by_path[reply.path[:PATH_SEGMENT_LENGTH]]
+        if len(root.thread_replies) < limit:
+            root.thread_replies.append(reply)
+        else:
+            root.more_replies = True
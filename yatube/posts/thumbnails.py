@@ -0,0 +1,341 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import connection, connections, transaction
+from PIL import UnidentifiedImageError, features
+from sorl.thumbnail import default, delete, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.models import KVStore
+
+from yatube.settings import IMAGE_VARIANT_WIDTHS
+
+from .feed_cache import bump_feed_generation, post_scope, post_scopes
+from .images import (IMAGE_METADATA_FIELDS, PLACEHOLDER_FIELDS,
+                     fill_image_metadata, image_placeholder, normalized_image)
+from .models import Post, ThumbnailJob
+
+logger = logging.getLogger(__name__)
+
+# пропорции картинки в карточке поста
+IMAGE_RATIO = (960, 339)
+# ширина картинки на странице для атрибута sizes
+IMAGE_SIZES = '(min-width: 992px) 960px, 100vw'
+IMAGE_MIME_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+# WebP отдаём, только если Pillow собран с его поддержкой
+IMAGE_FORMATS = ('WEBP', 'JPEG') if features.check('webp') else ('JPEG',)
+
+
+def variant_geometry(width):
+    return f'{width}x{round(width * IMAGE_RATIO[1] / IMAGE_RATIO[0])}'
+
+
+# варианты картинки: (ширина, формат, геометрия, параметры sorl)
+IMAGE_VARIANTS = tuple(
+    (width, format_, variant_geometry(width),
+     {'crop': 'center', 'upscale': True, 'format': format_})
+    for format_ in IMAGE_FORMATS
+    for width in IMAGE_VARIANT_WIDTHS
+)
+# размеры миниатюр, которые используют шаблоны
+THUMBNAIL_GEOMETRIES = tuple(
+    (geometry_string, options)
+    for _, _, geometry_string, options in IMAGE_VARIANTS
+)
+
+_executor = None
+# задания, отданные фоновым потокам и ещё не завершённые
+_pending = set()
+
+
+class CachedThumbnailBackend(ThumbnailBackend):
+    """Ищет готовую миниатюру в хранилище ключей, не создавая её."""
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        """Файл миниатюры с тем же именем, что выдал бы get_thumbnail."""
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def get_cached_thumbnail(self, file_, geometry_string, **options):
+        thumbnail = self.thumbnail_file(file_, geometry_string, **options)
+        prefetched = getattr(getattr(file_, 'instance', None),
+                             'prefetched_thumbnails', None)
+        if prefetched is not None and thumbnail.name in prefetched:
+            return prefetched[thumbnail.name]
+        return default.kvstore.get(thumbnail)
+
+
+backend = CachedThumbnailBackend()
+
+
+def cached_thumbnail(image, geometry_string, **options):
+    """Готовая миниатюра картинки или None, если её ещё нет."""
+    if not image:
+        return None
+    return backend.get_cached_thumbnail(image, geometry_string, **options)
+
+
+def image_sources(image):
+    """Готовые варианты картинки для разметки <picture>.
+
+    Возвращает источники по форматам в порядке предпочтения — у каждого
+    MIME-тип, srcset и самый широкий вариант — или пустой список, пока
+    ни одной миниатюры нет.
+    """
+    ready = {}
+    for width, format_, geometry_string, options in IMAGE_VARIANTS:
+        thumbnail = cached_thumbnail(image, geometry_string, **options)
+        if thumbnail is not None:
+            ready.setdefault(format_, []).append((width, thumbnail))
+    return [
+        {
+            'type': IMAGE_MIME_TYPES[format_],
+            'srcset': ', '.join(f'{thumbnail.url} {width}w'
+                                for width, thumbnail in variants),
+            'largest': variants[-1][1],
+        }
+        for format_, variants in ready.items()
+    ]
+
+
+def prefetch_thumbnails(posts):
+    """Загружает готовые миниатюры постов страницы пачкой.
+
+    Вместо запроса к кешу на каждую картинку — один get_many, а ключи,
+    которых нет в кеше, читаются из БД одним запросом. Найденное
+    складывается в post.prefetched_thumbnails, откуда его берёт
+    cached_thumbnail.
+    """
+    kvstore = default.kvstore
+    if not hasattr(kvstore, 'cache'):
+        return
+    wanted = {}
+    for post in posts:
+        if not post.image:
+            continue
+        post.prefetched_thumbnails = {}
+        for geometry_string, options in THUMBNAIL_GEOMETRIES:
+            thumbnail = backend.thumbnail_file(
+                post.image, geometry_string, **options)
+            wanted.setdefault(add_prefix(thumbnail.key), []).append(
+                (post, thumbnail.name))
+    if not wanted:
+        return
+    values = kvstore.cache.get_many(list(wanted))
+    missing = [key for key in wanted if key not in values]
+    if missing:
+        found = dict(KVStore.objects.filter(key__in=missing)
+                     .values_list('key', 'value'))
+        kvstore.cache.set_many(
+            {key: found.get(key, EMPTY_VALUE) for key in missing},
+            thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(found)
+    for key, targets in wanted.items():
+        value = values.get(key, EMPTY_VALUE)
+        image = None if value is EMPTY_VALUE else deserialize_image_file(
+            value)
+        for post, name in targets:
+            post.prefetched_thumbnails[name] = image
+
+
+def generate_thumbnails(image):
+    for geometry_string, options in THUMBNAIL_GEOMETRIES:
+        get_thumbnail(image, geometry_string, **options)
+
+
+def source_image(name):
+    """Исходная картинка поста по имени файла в её хранилище."""
+    return ImageFile(name, Post._meta.get_field('image').storage)
+
+
+def build_variants(name):
+    """Создаёт все варианты картинки; выполняется в процессе пула."""
+    try:
+        generate_thumbnails(source_image(name))
+    finally:
+        connections.close_all()
+    return name
+
+
+def prepare_post_image(post):
+    """Приводит оригинал поста к норме и готовит для него заглушку.
+
+    Если оригинал нужно повернуть, очистить или уменьшить, он заменяется
+    перекодированной копией. Пост обновляется, только пока у него та же
+    картинка: если автор успел загрузить новую, копия удаляется и
+    возвращается False.
+    """
+    original = post.image.name
+    with post.image.storage.open(original) as file_:
+        content = normalized_image(file_)
+        if content is None:
+            # картинку могли сохранить и в обход формы, например в админке
+            fill_image_metadata(post, file_)
+            placeholder = image_placeholder(file_)
+    fields = [*PLACEHOLDER_FIELDS, *IMAGE_METADATA_FIELDS]
+    if content is not None:
+        fill_image_metadata(post, content)
+        placeholder = image_placeholder(content)
+        post.image.save(os.path.basename(original), content, save=False)
+        fields.append('image')
+    for field, value in placeholder.items():
+        setattr(post, field, value)
+    since = time.time()
+    # условное обновление вместо save(): между чтением и записью картинку
+    # могли заменить, и тогда её нельзя перезаписать старой копией
+    updated = Post.objects.filter(pk=post.pk, image=original).update(
+        **{field: getattr(post, field) for field in fields})
+    if not updated:
+        if post.image.name != original:
+            name = post.image.name
+            transaction.on_commit(lambda: release_image(name))
+        return False
+    if post.image.name != original:
+        transaction.on_commit(lambda: release_image(original, since))
+    return True
+
+
+def thumbnails_ready(post):
+    """Сбрасывает всё, что запомнило картинку поста без миниатюр.
+
+    Промах в хранилище ключей кешируется, а страницы лент и их ETag
+    могли быть собраны, пока миниатюр ещё не было.
+    """
+    kvstore = default.kvstore
+    if hasattr(kvstore, 'cache'):
+        kvstore.cache.delete_many([
+            add_prefix(backend.thumbnail_file(
+                post.image, geometry_string, **options).key)
+            for geometry_string, options in THUMBNAIL_GEOMETRIES])
+    bump_feed_generation(*post_scopes(post), post_scope(post.id))
+
+
+def process_job(job_id):
+    """Готовит оригинал поста, создаёт его миниатюры и снимает задание
+    с очереди."""
+    job = ThumbnailJob.objects.select_related('post').filter(
+        pk=job_id).first()
+    if job is None:
+        return
+    if job.post.image:
+        try:
+            if prepare_post_image(job.post):
+                generate_thumbnails(job.post.image)
+                thumbnails_ready(job.post)
+        except (OSError, UnidentifiedImageError):
+            # пропавший или битый файл не починится от повтора, а очередь
+            # не должна вставать из-за одного задания
+            logger.exception('Не удалось обработать картинку поста %s',
+                             job.post_id)
+    # за время работы картинку могли заменить: тогда задание уже ждёт
+    # новую, и снимать его нельзя
+    ThumbnailJob.objects.filter(pk=job.pk, image=job.image).delete()
+
+
+def run_job(job_id):
+    try:
+        process_job(job_id)
+    finally:
+        connection.close()
+
+
+def background_workers():
+    """Число фоновых потоков для заданий миниатюр.
+
+    База SQLite в памяти живёт в общем кеше, и параллельное соединение
+    получает «table is locked» сразу, а не ждёт. С ней, как и при
+    THUMBNAIL_WORKERS = 0, задания копятся для process_thumbnails.
+    """
+    if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+        return 0
+    return settings.THUMBNAIL_WORKERS
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails')
+    return _executor
+
+
+def submit_job(job_id):
+    future = executor().submit(run_job, job_id)
+    _pending.add(future)
+    future.add_done_callback(_pending.discard)
+
+
+def wait_for_thumbnails():
+    """Дожидается заданий, уже отданных фоновым потокам."""
+    wait(list(_pending))
+
+
+def enqueue_thumbnails(post):
+    """Ставит картинку поста в очередь на фоновую генерацию миниатюр.
+
+    Задание хранится в БД и переживает перезапуск: невыполненные
+    задания дорабатывает команда process_thumbnails. Без фоновых
+    потоков (см. background_workers) задания только копятся для неё.
+    """
+    if not post.image:
+        return
+    job, _ = ThumbnailJob.objects.update_or_create(
+        post=post, defaults={'image': post.image.name})
+    if background_workers():
+        transaction.on_commit(lambda: submit_job(job.pk))
+
+
+def process_pending_jobs():
+    """Выполняет все задания очереди в текущем потоке."""
+    job_ids = list(ThumbnailJob.objects.order_by('pk').values_list(
+        'pk', flat=True))
+    for job_id in job_ids:
+        process_job(job_id)
+    return len(job_ids)
+
+
+def touched_since(name, since):
+    storage = Post._meta.get_field('image').storage
+    try:
+        return os.path.getmtime(storage.path(name)) >= since
+    except FileNotFoundError:
+        return False
+
+
+def release_image(name, since=None):
+    """Удаляет картинку и её миниатюры, когда на неё не ссылается ни один
+    пост.
+
+    Одинаковые загрузки делят один файл, поэтому число ссылок — это
+    число постов с таким именем картинки. since — когда картинку решили
+    освободить: если её с тех пор загрузили снова, пост с ней может быть
+    ещё не сохранён, и файл остаётся (лишний уберёт collect_media_garbage).
+    """
+    if not name or Post.objects.filter(image=name).exists():
+        return False
+    try:
+        if since is not None and touched_since(name, since):
+            return False
+        delete(source_image(name))
+    except SuspiciousFileOperation:
+        # путь вне MEDIA_ROOT не принадлежит хранилищу
+        return False
+    return True
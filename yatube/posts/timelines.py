@@ -0,0 +1,145 @@
+"""Кэшированные ленты авторов и их слияние для страницы подписок.
+
+Для каждого автора в кэше лежат ключи (pub_date, id) его последних
+TIMELINE_LENGTH постов — массив целых, дата хранится в микросекундах.
+Ключи взяты с обратным знаком, чтобы лента от новых постов к старым шла
+по возрастанию: так по ней работают bisect и heapq.merge. Страница
+подписок собирается k-путевым слиянием этих массивов через кучу и одной
+выборкой постов по id. Если слиянию не хватает обрезанной ленты
+какого-то автора, страница строится по FeedEntry, как раньше.
+"""
+import heapq
+from array import array
+from bisect import bisect_right, insort
+from datetime import datetime, timedelta
+from itertools import islice
+
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from yatube.settings import TIMELINE_LENGTH, TIMELINE_TIMEOUT
+
+from .models import Post
+from .paginators import CursorPaginator, decode_cursor, encode_cursor
+from .windows import first_per_group
+
+TIMELINE_TYPECODE = 'q'
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def timeline_key(author_id):
+    return f'timeline:{author_id}'
+
+
+def timeline_entry(pub_date, pk):
+    return (-((pub_date - EPOCH) // MICROSECOND), -pk)
+
+
+def load_timelines(author_ids):
+    """Ключи последних постов авторов одним запросом, от новых к старым."""
+    timelines = {author_id: [] for author_id in author_ids}
+    posts = first_per_group(
+        Post.objects.filter(author_id__in=author_ids).only(
+            'id', 'author_id', 'pub_date'),
+        partition_by=[F('author_id')],
+        order_by=[F('pub_date').desc(), F('id').desc()],
+        limit=TIMELINE_LENGTH,
+    )
+    for post in posts:
+        timelines[post.author_id].append(
+            timeline_entry(post.pub_date, post.id))
+    for timeline in timelines.values():
+        timeline.sort()
+    return timelines
+
+
+def pack(keys):
+    return array(TIMELINE_TYPECODE,
+                 (value for key in keys for value in key)).tobytes()
+
+
+def unpack(raw):
+    values = array(TIMELINE_TYPECODE)
+    values.frombytes(raw)
+    return list(zip(values[::2], values[1::2]))
+
+
+def author_timelines(author_ids):
+    """Ленты авторов одним обращением к кэшу; промахи — одним запросом."""
+    keys = {timeline_key(author_id): author_id for author_id in author_ids}
+    cached = cache.get_many(keys)
+    timelines = {keys[key]: unpack(raw) for key, raw in cached.items()}
+    missing = [author_id for key, author_id in keys.items()
+               if key not in cached]
+    if missing:
+        loaded = load_timelines(missing)
+        cache.set_many({timeline_key(author_id): pack(timeline)
+                        for author_id, timeline in loaded.items()},
+                       TIMELINE_TIMEOUT)
+        timelines.update(loaded)
+    return timelines
+
+
+def push_timeline(post):
+    """Добавляет новый пост в закэшированную ленту автора."""
+    key = timeline_key(post.author_id)
+    raw = cache.get(key)
+    if raw is None:
+        return
+    timeline = unpack(raw)
+    insort(timeline, timeline_entry(post.pub_date, post.id))
+    cache.set(key, pack(timeline[:TIMELINE_LENGTH]), TIMELINE_TIMEOUT)
+
+
+def forget_timeline(author_id):
+    # после удаления обрезанная лента могла бы потерять хвост,
+    # поэтому она просто перечитывается при следующем обращении
+    cache.delete(timeline_key(author_id))
+
+
+def merge_timelines(timelines, cursor, limit):
+    """Первые limit ключей старше cursor по всем лентам.
+
+    Возвращает None, если какой-то обрезанной ленты не хватило: за её
+    концом могли остаться посты, которые попали бы на страницу.
+    """
+    tails = [timeline[bisect_right(timeline, cursor):] if cursor else timeline
+             for timeline in timelines]
+    keys = list(islice(heapq.merge(*tails), limit))
+    for timeline in timelines:
+        if len(timeline) < TIMELINE_LENGTH:
+            continue
+        if len(keys) < limit or keys[-1] > timeline[-1]:
+            return None
+    return keys
+
+
+class TimelinePaginator(CursorPaginator):
+    """Курсорная страница подписок, собранная из лент авторов."""
+
+    def __init__(self, author_ids, per_page, **kwargs):
+        super().__init__(Post.objects.none(), per_page, **kwargs)
+        self.author_ids = author_ids
+
+    def get_page(self, after=None):
+        """Страница после курсора after или None, если лент не хватило."""
+        cursor = decode_cursor(after) if after else None
+        if cursor is not None:
+            cursor = timeline_entry(*cursor)
+        timelines = author_timelines(self.author_ids).values()
+        keys = merge_timelines(list(timelines), cursor, self.per_page + 1)
+        if keys is None:
+            return None
+        self.has_next = len(keys) > self.per_page
+        self.has_previous = cursor is not None
+        ids = [-pk for _, pk in keys[:self.per_page]]
+        posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+        rows = [posts[pk] for pk in ids if pk in posts]
+        page = self._get_page(rows, self.number, self)
+        page.next_cursor = (encode_cursor(rows[-1])
+                            if self.has_next and rows else None)
+        page.previous_cursor = (encode_cursor(rows[0])
+                                if self.has_previous and rows else None)
+        return page
@@ -0,0 +1,126 @@
+import hashlib
+import mimetypes
+import os
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.utils import timezone
+
+from yatube.settings import UPLOAD_SESSION_ROOT, UPLOAD_SESSION_TTL
+
+from .models import UploadSession
+
+UPLOAD_BLOCK_SIZE = 64 * 1024
+
+
+class ChunkRejected(Exception):
+    """Кусок не принят; смещение сессии не изменилось."""
+
+
+class AssembledUpload(UploadedFile):
+    """Собранный из кусков файл, который форма принимает как загрузку.
+
+    Как и у TemporaryUploadedFile, у него есть путь на диске, поэтому
+    хранилище перемещает файл, а не копирует его. Файл открывается при
+    первом чтении: форма, которую так и не проверили, его не держит.
+    """
+
+    def __init__(self, session):
+        self.path = session_path(session)
+        self._file = None
+        super().__init__(
+            None, session.filename,
+            mimetypes.guess_type(session.filename)[0], session.size)
+
+    @property
+    def file(self):
+        if self._file is None:
+            self._file = open(self.path, 'rb')
+        return self._file
+
+    @file.setter
+    def file(self, value):
+        self._file = value
+
+    @property
+    def closed(self):
+        return self._file is None or self._file.closed
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def temporary_file_path(self):
+        return self.path
+
+
+def session_path(session):
+    return os.path.join(UPLOAD_SESSION_ROOT, f'{session.pk}.part')
+
+
+def start_upload(session):
+    """Сохраняет новую сессию и создаёт для неё пустой файл."""
+    purge_stale_uploads()
+    # id задаётся по умолчанию, и без force_insert Django 2.2 сначала
+    # пробует UPDATE несуществующей строки
+    session.save(force_insert=True)
+    os.makedirs(UPLOAD_SESSION_ROOT, exist_ok=True)
+    open(session_path(session), 'wb').close()
+    return session
+
+
+def append_chunk(session, stream, length, checksum):
+    """Дописывает кусок в файл сессии, сверяя его SHA-256.
+
+    Кусок читается из запроса блоками, так что в памяти его целиком нет.
+    Повреждённый или оборванный кусок отрезается, и клиент повторяет его
+    с прежнего смещения.
+    """
+    if session.offset + length > session.size:
+        raise ChunkRejected('Кусок выходит за объявленный размер файла')
+    digest = hashlib.sha256()
+    with open(session_path(session), 'r+b') as file_:
+        file_.seek(session.offset)
+        remaining = length
+        while remaining:
+            block = stream.read(min(remaining, UPLOAD_BLOCK_SIZE))
+            if not block:
+                break
+            digest.update(block)
+            file_.write(block)
+            remaining -= len(block)
+        if remaining or digest.hexdigest() != checksum.lower():
+            file_.truncate(session.offset)
+            raise ChunkRejected('Контрольная сумма куска не совпала')
+        file_.truncate()
+    session.offset += length
+    session.save(update_fields=['offset', 'updated'])
+
+
+def find_upload(upload_id, user):
+    try:
+        return UploadSession.objects.filter(pk=upload_id, user=user).first()
+    except ValidationError:
+        return None
+
+
+def discard_upload(session):
+    """Удаляет сессию и остаток её файла."""
+    try:
+        os.remove(session_path(session))
+    except FileNotFoundError:
+        pass
+    session.delete()
+
+
+def purge_stale_uploads(ttl=UPLOAD_SESSION_TTL):
+    """Удаляет сессии, в которые давно не приходили куски."""
+    stale = UploadSession.objects.filter(
+        updated__lt=timezone.now() - timedelta(seconds=ttl))
+    purged = 0
+    for session in stale.iterator():
+        discard_upload(session)
+        purged += 1
+    return purged
@@ -19,8 +19,16 @@ urlpatterns = [
         name="profile_unfollow"
     ),
     path('profile/<str:username>/', views.profile, name='profile'),
+    path('uploads/', views.upload_create, name='upload_create'),
+    path('uploads/<uuid:upload_id>/', views.upload_chunk,
+         name='upload_chunk'),
+    path('posts/export/', views.post_export, name='post_export'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/comment', views.add_comment, name='add_comment'),
+    path('posts/<int:post_id>/comments/', views.post_comments,
+         name='post_comments'),
+    path('posts/<int:post_id>/comments/<int:comment_id>/replies/',
+         views.comment_replies, name='comment_replies'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('', views.index, name='index'),
 ]
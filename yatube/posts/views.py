@@ -1,73 +1,89 @@
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import IntegrityError, transaction
+from django.http import (HttpResponseBadRequest, HttpResponseNotAllowed,
+                         JsonResponse, StreamingHttpResponse)
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
+from django.views.decorators.http import condition, require_POST
 
-from yatube.settings import POSTS_ON_THE_PAGES
+from yatube.settings import POSTS_ON_THE_PAGES, UPLOAD_CHUNK_SIZE
 
-from .models import Follow, Group, Post, User
-from posts.forms import CommentForm, PostForm
+from .etags import (comment_etag, follow_etag, group_etag, index_etag,
+                    post_etag, profile_etag)
+from .export import EXPORT_FORMATS, export_lines
+from .feed_cache import (INDEX_SCOPE, author_scope, feed_cache_context,
+                         follow_count_scope, group_scope)
+from .followees import followee_ids, is_following
+from .models import Comment, Follow, Group, Post, UploadSession, User
+from .paginators import paginate, paginate_comments
+from .threads import next_replies
+from .timelines import TimelinePaginator
+from .uploads import ChunkRejected, append_chunk, start_upload
+from posts.forms import (CommentForm, ExportForm, PostForm, ReplyForm,
+                         UploadForm)
 
 
+@condition(etag_func=index_etag)
 def index(request):
-    posts = Post.objects.all()
-    paginator = Paginator(posts, POSTS_ON_THE_PAGES)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = Post.objects.select_related('author', 'group')
+    page_obj = paginate(request, posts, INDEX_SCOPE)
     context = {
         'page_obj': page_obj,
+        **feed_cache_context(request, INDEX_SCOPE),
     }
     return render(request, 'posts/index.html', context)
 
 
+@condition(etag_func=group_etag)
 def group_posts(request, SlugField):
     group = get_object_or_404(Group, slug=SlugField)
-    posts = group.groups4all.all()
-    paginator = Paginator(posts, POSTS_ON_THE_PAGES)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = group.groups4all.select_related('author', 'group')
+    scope = group_scope(group.id)
+    page_obj = paginate(request, posts, scope)
     context = {
         'group': group,
         'page_obj': page_obj,
+        **feed_cache_context(request, scope),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@condition(etag_func=profile_etag)
 def profile(request, username):
-    following = False
-    if request.user.is_authenticated:
-        author = User.objects.get(username=username)
-        follow = Follow.objects.filter(user=request.user, author=author)
-        if len(follow) != 0:
-            following = True
-    user = get_object_or_404(User, username=username)
-    posts = user.posts.all()
-    paginator = Paginator(posts, POSTS_ON_THE_PAGES)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    user = get_object_or_404(User.objects.select_related('stats'),
+                             username=username)
+    following = (request.user.is_authenticated
+                 and is_following(request.user.pk, user.id))
+    posts = user.posts.select_related('author', 'group')
+    scope = author_scope(user.id)
+    page_obj = paginate(request, posts, scope)
 
     context = {
         'username': user,
         'page_obj': page_obj,
-        'following': following
+        'following': following,
+        **feed_cache_context(request, scope),
     }
     return render(request, 'posts/profile.html', context)
 
 
 @login_required
 def add_comment(request, post_id):
-    form = CommentForm(request.POST or None)
+    post = get_object_or_404(Post, id=post_id)
+    form = ReplyForm(request.POST or None, post=post)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
-        comment.post = get_object_or_404(Post, id=post_id)
+        comment.post = post
         comment.save()
     return redirect(reverse('post:post_detail', args=[post_id]))
 
 
+@condition(etag_func=post_etag)
 def post_detail(request, post_id):
     is_edit = False
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id)
     form = CommentForm(request.POST or None,)
     if request.method == 'POST':
         if form.is_valid():
@@ -84,22 +100,49 @@ def post_detail(request, post_id):
         is_edit = True
     context = {
         'post': post,
+        'comments': paginate_comments(request, post),
         'form': form,
         'is_edit': is_edit,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@condition(etag_func=post_etag)
+def post_comments(request, post_id):
+    post = get_object_or_404(Post, id=post_id)
+    context = {
+        'post': post,
+        'comments': paginate_comments(request, post),
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
+@condition(etag_func=comment_etag)
+def comment_replies(request, post_id, comment_id):
+    root = get_object_or_404(Comment.objects.select_related('post'),
+                             id=comment_id, post_id=post_id, parent=None)
+    replies, more_replies = next_replies(root, request.GET.get('after'))
+    context = {
+        'post': root.post,
+        'root': root,
+        'replies': replies,
+        'more_replies': more_replies,
+    }
+    return render(request, 'posts/includes/comment_replies.html', context)
+
+
 @login_required
 def post_create(request):
     is_edit = False
     form = PostForm(request.POST or None,
-                    files=request.FILES or None,)
+                    files=request.FILES or None,
+                    uploader=request.user)
     if request.method == 'POST':
         if form.is_valid():
             post = form.save(commit=False)
             post.author = request.user
             post.save()
+            form.discard_upload()
             return redirect(reverse('post:profile',
                             args=[request.user.username]))
         else:
@@ -115,12 +158,14 @@ def post_edit(request, post_id):
     post = Post.objects.get(pk=post_id)
     form = PostForm(request.POST or None,
                     files=request.FILES or None,
-                    instance=post)
+                    instance=post,
+                    uploader=request.user)
     if post.author == request.user:
         is_edit = True
         if request.method == 'POST':
             if form.is_valid():
                 form.save()
+                form.discard_upload()
                 return redirect(reverse('post:post_detail', args=[post_id]))
             else:
                 return render(request, 'posts/create_post.html',
@@ -132,13 +177,23 @@ def post_edit(request, post_id):
 
 
 @login_required
+@condition(etag_func=follow_etag)
 def follow_index(request):
-    follow = Follow.objects.filter(user=request.user)
-    follow_list = follow.values_list('author')
-    posts = Post.objects.filter(author__in=follow_list)
-    paginator = Paginator(posts, POSTS_ON_THE_PAGES)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = None
+    author_ids = followee_ids(request.user.pk)
+    # страницы вперёд собираются из лент авторов, остальные — по FeedEntry
+    if 'page' not in request.GET and 'before' not in request.GET:
+        page_obj = TimelinePaginator(
+            author_ids, POSTS_ON_THE_PAGES,
+        ).get_page(after=request.GET.get('after'))
+    if page_obj is None:
+        entries = request.user.feed_entries.select_related(
+            'post__author', 'post__group')
+        page_obj = paginate(
+            request, entries,
+            follow_count_scope(request.user.pk, author_ids),
+            key=('pub_date', 'post_id'))
+        page_obj.object_list = [entry.post for entry in page_obj]
     context = {'page_obj': page_obj}
     return render(request, 'posts/follow.html', context)
 
@@ -146,17 +201,84 @@ def follow_index(request):
 @login_required
 def profile_follow(request, username):
     author = User.objects.get(username=username)
-    if (request.user == author
-            or request.user.follower.filter(author=author).exists()):
-        return redirect(reverse('post:profile', args=[username]))
-
-    Follow.objects.create(user=request.user, author=author)
+    if request.user != author:
+        # кэш подписок может отставать от базы, поэтому решает её
+        # ограничение уникальности
+        try:
+            with transaction.atomic():
+                Follow.objects.create(user=request.user, author=author)
+        except IntegrityError:
+            pass
     return redirect(reverse('post:profile', args=[username]))
 
 
 @login_required
 def profile_unfollow(request, username):
     author = User.objects.get(username=username)
-    follow = Follow.objects.get(user=request.user, author=author)
-    follow.delete()
+    Follow.objects.filter(user=request.user, author=author).delete()
     return redirect(reverse('post:profile', args=[username]))
+
+
+@login_required
+def post_export(request):
+    form = ExportForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_json(),
+                                      content_type='application/json')
+    filters = form.cleaned_data
+    export_format = filters.pop('format')
+    response = StreamingHttpResponse(
+        export_lines(export_format, **filters),
+        content_type=EXPORT_FORMATS[export_format],
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="posts.{export_format}"')
+    return response
+
+
+@login_required
+@require_POST
+def upload_create(request):
+    form = UploadForm(request.POST)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_json(),
+                                      content_type='application/json')
+    upload = form.save(commit=False)
+    upload.user = request.user
+    start_upload(upload)
+    return JsonResponse({'id': upload.id, 'offset': 0,
+                         'chunk_size': UPLOAD_CHUNK_SIZE}, status=201)
+
+
+@login_required
+def upload_chunk(request, upload_id):
+    if request.method == 'GET':
+        upload = get_object_or_404(UploadSession, pk=upload_id,
+                                   user=request.user)
+        return JsonResponse({'offset': upload.offset, 'size': upload.size})
+    if request.method != 'PUT':
+        return HttpResponseNotAllowed(['GET', 'PUT'])
+    try:
+        offset = int(request.META['HTTP_UPLOAD_OFFSET'])
+        length = int(request.META['CONTENT_LENGTH'])
+        checksum = request.META['HTTP_X_CHUNK_SHA256']
+    except (KeyError, ValueError):
+        return JsonResponse(
+            {'error': 'Нужны заголовки Upload-Offset, Content-Length '
+                      'и X-Chunk-Sha256'}, status=400)
+    if not 0 < length <= UPLOAD_CHUNK_SIZE:
+        return JsonResponse(
+            {'error': f'Кусок должен быть до {UPLOAD_CHUNK_SIZE} байт'},
+            status=400)
+    with transaction.atomic():
+        upload = get_object_or_404(
+            UploadSession.objects.select_for_update(), pk=upload_id,
+            user=request.user)
+        if offset != upload.offset:
+            return JsonResponse({'offset': upload.offset}, status=409)
+        try:
+            append_chunk(upload, request, length, checksum)
+        except ChunkRejected as error:
+            return JsonResponse({'error': str(error),
+                                 'offset': upload.offset}, status=400)
+    return JsonResponse({'offset': upload.offset, 'size': upload.size})
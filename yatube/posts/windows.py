@@ -0,0 +1,18 @@
+"""Первые строки каждой группы одним запросом с оконной функцией."""
+from django.db.models import Window
+from django.db.models.functions import RowNumber
+
+
+def first_per_group(queryset, partition_by, order_by, limit):
+    """Первые limit строк queryset в каждой группе partition_by.
+
+    Строки нумеруются ROW_NUMBER() внутри группы, а отбор по номеру
+    делается во внешнем запросе: фильтровать по оконной функции ORM
+    не умеет. Возвращает RawQuerySet модели queryset.
+    """
+    ranked = queryset.order_by().annotate(position=Window(
+        RowNumber(), partition_by=partition_by, order_by=order_by))
+    sql, params = ranked.query.sql_with_params()
+    return queryset.model.objects.using(queryset.db).raw(
+        f'SELECT * FROM ({sql}) ranked WHERE position <= %s',
+        (*params, limit))
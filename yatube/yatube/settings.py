@@ -87,11 +87,23 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# адрес memcached, общего для всех процессов сервера; без него у каждого
+# процесса свой кэш в памяти, и сброс кэша в одном процессе не виден
+# остальным
+CACHE_LOCATION = os.environ.get('CACHE_LOCATION')
+if CACHE_LOCATION:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+            'LOCATION': CACHE_LOCATION,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
     }
-}
 
 LANGUAGE_CODE = 'ru-ru'
 
@@ -110,6 +122,37 @@ STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 
 STRING_EMPTY = '-пусто-'
 POSTS_ON_THE_PAGES = 10
+COMMENTS_ON_THE_PAGE = 20
+COMMENT_MAX_DEPTH = 6
+# ответов под корневым комментарием до ссылки «Показать ещё ответы»
+COMMENT_REPLIES_ON_THE_PAGE = 10
+# в кэше отдельного процесса записи живут недолго: только истечение
+# срока сбрасывает то, что изменили другие процессы
+LOCAL_CACHE_TIMEOUT = 30
+FEED_CACHE_TIMEOUT = 60 * 60 * 24 if CACHE_LOCATION else LOCAL_CACHE_TIMEOUT
+# поколения лент входят в ETag и без общего кэша тоже должны устаревать
+FEED_GENERATION_TIMEOUT = None if CACHE_LOCATION else LOCAL_CACHE_TIMEOUT
+FEED_COUNT_TIMEOUT = 60 * 15 if CACHE_LOCATION else LOCAL_CACHE_TIMEOUT
+FOLLOWEES_TIMEOUT = 60 * 60 * 24 if CACHE_LOCATION else LOCAL_CACHE_TIMEOUT
+TIMELINE_LENGTH = 200
+TIMELINE_TIMEOUT = 60 * 60 * 24 if CACHE_LOCATION else LOCAL_CACHE_TIMEOUT
+FEED_COUNT_ESTIMATE = False
+FEED_COUNT_ESTIMATE_LIMIT = 1000
+# 0 — не строить миниатюры в фоне: задания ждут process_thumbnails
+THUMBNAIL_WORKERS = 2
+# хранилище ключей sorl-thumbnail запоминает и отсутствие миниатюр
+if not CACHE_LOCATION:
+    THUMBNAIL_CACHE_TIMEOUT = LOCAL_CACHE_TIMEOUT
+IMAGE_VARIANT_WIDTHS = (320, 640, 960)
+# пределы загружаемых картинок: число пикселей и сторона оригинала
+IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+IMAGE_MAX_SIDE = 2560
+# загрузка по кускам: каталог недокачанных файлов вне MEDIA_ROOT,
+# предел размера файла, рекомендуемый кусок и срок жизни сессии
+UPLOAD_SESSION_ROOT = os.path.join(BASE_DIR, 'uploads')
+UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_SESSION_TTL = 60 * 60 * 24
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'post:index'
@@ -122,3 +165,7 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# медиа может отдавать фронтенд-прокси: префикс internal location в nginx
+# для X-Accel-Redirect или True для X-Sendfile (Apache, lighttpd)
+MEDIA_ACCEL_REDIRECT = ''
+MEDIA_SENDFILE = False